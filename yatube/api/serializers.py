@@ -0,0 +1,30 @@
+"""Компактные словари для JSON-ответов API."""
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'comment_count': post.comment_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username if comment.author_id else None,
+        'text': comment.text,
+        'created': comment.created,
+    }
+
+
+def serialize_page(page, serializer):
+    return {
+        'results': [serializer(obj) for obj in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
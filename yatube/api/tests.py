@@ -0,0 +1,183 @@
+import base64
+import gzip
+import json
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import run_on_commit
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import NUMBER_OF_POSTS
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.group = Group.objects.create(
+            title='Просто группа',
+            slug='slug_test',
+            description='Важное описание',
+        )
+        for num in range(NUMBER_OF_POSTS + 3):
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Просто пост номер: {num}',
+            )
+        cls.post = Post.objects.latest('pub_date', 'pk')
+        Comment.objects.create(post=cls.post, author=cls.user, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feeds_return_cursor_pages(self):
+        """Ленты отдают JSON-страницы по курсору"""
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_list', kwargs={'slug': self.group.slug}),
+            reverse('api:profile', kwargs={'username': self.author}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(len(first['results']), NUMBER_OF_POSTS)
+                self.assertEqual(first['results'][0], {
+                    'id': self.post.pk,
+                    'text': self.post.text,
+                    'pub_date': first['results'][0]['pub_date'],
+                    'author': self.author.username,
+                    'group': self.group.slug,
+                    'image': None,
+                    'comment_count': 1,
+                })
+                second = self.client.get(url, {'cursor': first['next']})
+                self.assertEqual(len(second.json()['results']), 3)
+                self.assertIsNone(second.json()['next'])
+
+    def test_unchanged_feed_returns_not_modified(self):
+        """Повторный запрос с ETag получает дешёвый 304"""
+        url = reverse('api:index')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_edit_is_not_hidden_by_if_modified_since(self):
+        """Last-Modified сдвигается и при правке поста"""
+        url = reverse('api:index')
+        last_modified = self.client.get(url)['Last-Modified']
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        post = Post.objects.get(pk=self.post.pk)
+        # Поколение на пару секунд позже: заголовок точен до секунды.
+        later = time.time_ns() + 2 * 10 ** 9
+        with mock.patch('posts.generations._initial', return_value=later), \
+                run_on_commit():
+            post.text = 'Исправленный текст'
+            post.save()
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+        self.assertEqual(
+            response.json()['results'][0]['text'], 'Исправленный текст')
+
+    def test_follow_feed(self):
+        """Лента подписок требует авторизации и зависит от подписок"""
+        url = reverse('api:follow_index')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.json()['results'], [])
+
+        Follow.objects.create(user=self.user, author=self.author)
+        changed = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['results']), NUMBER_OF_POSTS)
+
+    def test_post_detail_with_comments(self):
+        """Пост отдаётся вместе с комментариями"""
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['post']['id'], self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']['results']],
+            ['Ок'])
+
+        with run_on_commit():
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Ещё')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['comments']['results']), 2)
+
+    def test_errors(self):
+        """Некорректный курсор и несуществующая группа"""
+        response = self.client.get(reverse('api:index'), {'cursor': 'xxx'})
+        self.assertEqual(response.status_code, 400)
+        # pk вне 64-битного диапазона — тоже некорректный курсор, а не 500.
+        for pk in ('100000000000000000000', '1e400'):
+            payload = f'["o", "2023-01-01T00:00:00+00:00", {pk}]'
+            cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+            with self.subTest(pk=pk):
+                response = self.client.get(
+                    reverse('api:index'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse('api:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Reader')
+        cls.staff = User.objects.create_user(
+            username='Staff', is_staff=True)
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def test_export_is_staff_only(self):
+        """Выгрузка доступна только персоналу"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('api:export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_streams_ndjson(self):
+        """Выгрузка отдаётся потоком NDJSON, при возможности в gzip"""
+        self.client.force_login(self.staff)
+        url = reverse('api:export')
+        response = self.client.get(url, {'types': 'post'})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in
+                b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row.get('text') for row in rows], ['Пост', None])
+        self.assertEqual(rows[-1]['since'], f'post:{rows[0]["id"]}')
+
+        response = self.client.get(
+            url, {'types': 'post', 'since': rows[-1]['since']},
+            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(json.loads(body)['type'], 'watermark')
+
+        for params in ({'since_date': 'вчера'}, {'since': 'post:x'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400)
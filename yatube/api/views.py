@@ -0,0 +1,149 @@
+"""Read-only JSON API лент для мобильных клиентов.
+
+ETag собирается из поколений лент (posts.generations) и адреса запроса,
+Last-Modified — из самого свежего поколения: поколения берутся из часов
+при каждом изменении, поэтому сдвигаются и при правке, и при удалении.
+На актуальные If-None-Match и If-Modified-Since ответ 304 отдаётся без
+запросов к базе. Last-Modified точен до секунды, точнее сравнивает ETag.
+"""
+import datetime
+import hashlib
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+from django.views.decorators.vary import vary_on_cookie
+
+from posts import export, generations, timeline
+from posts.models import Follow, Group, Post, User
+from posts.utils import (NUMBER_OF_COMMENTS, NUMBER_OF_POSTS,
+                         CursorPaginator, InvalidCursor)
+
+from .serializers import serialize_comment, serialize_page, serialize_post
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _etag(request, scopes):
+    versions = sorted(generations.get_many(scopes).items())
+    payload = f'{request.get_full_path()}|{versions}'
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _last_modified(scopes):
+    newest = max(generations.get_many(scopes).values())
+    return datetime.datetime.fromtimestamp(
+        newest / 10 ** 9, tz=datetime.timezone.utc)
+
+
+def _page(queryset, request, per_page, field='pub_date'):
+    paginator = CursorPaginator(queryset, per_page, field=field)
+    return paginator.page(request.GET.get('cursor'))
+
+
+def _conditional(request, scopes, build):
+    """Ответ с ETag и Last-Modified; build() вызывается только без 304."""
+    @condition(etag_func=lambda request: _etag(request, scopes),
+               last_modified_func=lambda request: _last_modified(scopes))
+    def respond(request):
+        try:
+            return _json(build())
+        except InvalidCursor:
+            return _json({'detail': 'Некорректный курсор'}, status=400)
+    return respond(request)
+
+
+def _feed(request, scopes, posts):
+    def build():
+        page = _page(posts.for_feed(), request, NUMBER_OF_POSTS)
+        return serialize_page(page, serialize_post)
+    return _conditional(request, scopes, build)
+
+
+@require_safe
+@cache_control(no_cache=True)
+def index(request):
+    return _feed(request, [generations.INDEX], Post.objects.all())
+
+
+@require_safe
+@cache_control(no_cache=True)
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return _feed(request, [generations.group(group.pk)], group.posts.all())
+
+
+@require_safe
+@cache_control(no_cache=True)
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return _feed(request, [generations.author(author.pk)],
+                 author.posts.all())
+
+
+@require_safe
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return _json({'detail': 'Требуется авторизация'}, status=401)
+    # Набор подписок входит в ETag вместе с поколениями их авторов, а
+    # поколение самого читателя сдвигает каждая подписка и отписка — без
+    # него Last-Modified после отписки мог бы уйти назад.
+    followed = Follow.objects.filter(
+        user=request.user).values_list('author_id', flat=True)
+    scopes = [generations.author(request.user.pk)] + [
+        generations.author(author_id) for author_id in followed]
+
+    def build():
+        feed = timeline.TimelinePaginator(request.user, NUMBER_OF_POSTS)
+        return serialize_page(
+            feed.page(request.GET.get('cursor')), serialize_post)
+    return _conditional(request, scopes, build)
+
+
+@require_safe
+@cache_control(no_cache=True)
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.only('author_id'), pk=post_id)
+
+    def build():
+        full_post = Post.objects.for_feed().get(pk=post.pk)
+        comments = _page(post.comments.select_related('author'), request,
+                         NUMBER_OF_COMMENTS, field='created')
+        return {
+            'post': serialize_post(full_post),
+            'comments': serialize_page(comments, serialize_comment),
+        }
+    return _conditional(
+        request, [generations.author(post.author_id)], build)
+
+
+@require_safe
+@staff_member_required
+def export_data(request):
+    """Потоковая NDJSON-выгрузка для аналитики, только для персонала."""
+    try:
+        types = export.parse_types(request.GET.get('types', ''))
+        since = export.parse_since(request.GET.get('since', ''))
+        since_date = request.GET.get('since_date')
+        since_date = since_date and export.parse_since_date(since_date)
+    except export.ExportError as error:
+        return _json({'detail': str(error)}, status=400)
+
+    chunks = export.lines(
+        types=types, since=since, since_date=since_date)
+    compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if compress:
+        chunks = export.gzipped(chunks)
+    response = StreamingHttpResponse(
+        chunks, content_type='application/x-ndjson; charset=utf-8')
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    return response
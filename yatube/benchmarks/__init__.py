@@ -0,0 +1,8 @@
+"""Замеры производительности Yatube.
+
+Запуск из каталога с manage.py::
+
+    python -m benchmarks.indexes --posts 1000000
+    python manage.py seed_bench_data --users 20000 --posts 200000
+    python -m benchmarks.views --database db.sqlite3
+"""
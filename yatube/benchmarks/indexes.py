@@ -0,0 +1,135 @@
+"""План запросов лент и их время до и после составных индексов.
+
+Скрипт создаёт отдельную временную базу SQLite, заливает в неё
+синтетические данные и сравнивает EXPLAIN QUERY PLAN и медианное время
+запросов без индексов из Meta.indexes и с ними.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def setup_django(db_path):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+
+    import django
+
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(options):
+    from django.core.management import call_command
+
+    call_command(
+        'seed_bench_data',
+        users=options.users,
+        groups=options.groups,
+        posts=options.posts,
+        comments=options.posts // 5,
+        seed=options.seed,
+        timeline_length=0,
+    )
+
+
+def feed_queries(options):
+    from posts.models import Comment, Follow, Post
+    from posts.utils import CURSOR_OLDER, NUMBER_OF_POSTS, CursorPaginator
+
+    def first_page(queryset, field='pub_date'):
+        paginator = CursorPaginator(queryset, NUMBER_OF_POSTS, field=field)
+        return paginator.seek(CURSOR_OLDER)
+
+    middle = Post.objects.order_by('pk')[options.posts // 2]
+    feed = Post.objects.for_feed()
+    return {
+        'index': first_page(feed),
+        'index, глубокая страница': (
+            CursorPaginator(feed, NUMBER_OF_POSTS)
+            .seek(CURSOR_OLDER, middle.pub_date, middle.pk)
+        ),
+        'profile': first_page(feed.filter(author_id=1)),
+        'group_posts': first_page(feed.filter(group_id=1)),
+        'post_detail, комментарии': first_page(
+            Comment.objects.filter(post_id=middle.pk), field='created'
+        ),
+        'подписчики автора': Follow.objects.filter(author_id=1).values('user'),
+    }
+
+
+def measure(queries, repeat):
+    from django.db import connection
+
+    results = {}
+    for name, queryset in queries.items():
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+        results[name] = (plan, statistics.median(timings))
+    return results
+
+
+def toggle_indexes(add):
+    from django.db import connection
+
+    from posts.models import Comment, Follow, Post
+
+    with connection.schema_editor() as editor:
+        for model in (Post, Comment, Follow):
+            for index in model._meta.indexes:
+                if add:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def report(before, after):
+    for name in before:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f'\n== {name}: {ms_before:.2f} мс -> {ms_after:.2f} мс')
+        print('  без индексов:')
+        for line in plan_before:
+            print(f'    {line}')
+        print('  с индексами:')
+        for line in plan_after:
+            print(f'    {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'bench.sqlite3'))
+        seed(options)
+        queries = feed_queries(options)
+        toggle_indexes(add=False)
+        before = measure(queries, options.repeat)
+        toggle_indexes(add=True)
+        after = measure(queries, options.repeat)
+        report(before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Время и число SQL-запросов основных страниц на большом наборе данных.
+
+Базу заранее заполняет ``manage.py seed_bench_data``. Страницы
+запрашиваются тестовым клиентом: первый запрос в процессе (с разбором
+шаблонов), холодный замер — с очищенным кэшем, тёплый — повторный запрос.
+Профиль настроек выбирается как обычно, через YATUBE_ENV.
+
+Итоги сравниваются с сохранённым базовым замером: рост числа запросов или
+времени больше допуска — регрессия, и скрипт завершается с кодом 1. Время
+сравнивается, только если совпадают данные и профиль. Базовый замер в
+репозитории снят в профиле prod на таких данных:
+
+    python manage.py seed_bench_data --users 5000 --posts 50000
+        --comments 150000 --timeline-length 500
+    YATUBE_ENV=prod python -m benchmarks.views --database db.sqlite3
+    python -m benchmarks.views --database db.sqlite3 --update-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.indexes import setup_django
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SLACK_MS = 2  # Меньший рост времени считается шумом
+
+
+def dataset():
+    from posts.models import Comment, Follow, Post, User
+
+    return {
+        'users': User.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+def targets():
+    """Самые тяжёлые экземпляры каждой страницы: (имя, url, читатель)."""
+    from django.db.models import Count
+    from django.urls import reverse
+
+    from posts.models import Comment, Group, Profile
+
+    group = Group.objects.annotate(
+        total=Count('posts')).order_by('-total').first()
+    author = Profile.objects.select_related('user').order_by(
+        '-posts_count').first().user
+    post_id = (
+        Comment.objects.values('post').annotate(total=Count('pk'))
+        .order_by('-total').values_list('post', flat=True).first()
+    )
+    reader = Profile.objects.select_related('user').order_by(
+        '-following_count', 'pk').first().user
+    return [
+        ('index', reverse('posts:index'), None),
+        ('group_posts',
+         reverse('posts:group_list', kwargs={'slug': group.slug}), None),
+        ('profile',
+         reverse('posts:profile', kwargs={'username': author.username}),
+         None),
+        ('post_detail',
+         reverse('posts:post_detail', kwargs={'post_id': post_id}), None),
+        ('follow_index', reverse('posts:follow_index'), reader),
+    ]
+
+
+def measure(url, reader, repeat):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    if reader is not None:
+        client.force_login(reader)
+
+    def timed():
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = (time.perf_counter() - started) * 1000
+        assert response.status_code == 200, (url, response.status_code)
+        return elapsed
+
+    # CaptureQueriesContext тут не подходит: request_started тестового
+    # клиента сбрасывает connection.queries посреди замера.
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    cache.clear()
+    with connection.execute_wrapper(count):
+        first = timed()
+    cold = []
+    for _ in range(repeat):
+        cache.clear()
+        queries.clear()
+        with connection.execute_wrapper(count):
+            cold.append(timed())
+    warm = [timed() for _ in range(repeat)]
+    return {
+        'queries': len(queries),
+        'first_ms': round(first, 2),
+        'cold_ms': round(statistics.median(cold), 2),
+        'warm_ms': round(statistics.median(warm), 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Печатает сравнение с базовым замером; возвращает число регрессий."""
+    regressions = 0
+    same_data = all(
+        baseline.get(key) == results[key] for key in ('dataset', 'profile'))
+    if not same_data:
+        print('Данные или профиль настроек отличаются от базового замера, '
+              'время не сравнивается.')
+    print(f'{"страница":<14}{"запросы":>10}{"первый, мс":>14}'
+          f'{"холодно, мс":>16}{"тепло, мс":>14}')
+    for name, now in results['views'].items():
+        before = baseline['views'].get(name)
+        marks = []
+        if before is not None:
+            if now['queries'] > before['queries']:
+                marks.append(f'запросов было {before["queries"]}')
+            for metric in ('first_ms', 'cold_ms', 'warm_ms'):
+                if metric not in before:
+                    continue
+                limit = max(before[metric] * (1 + tolerance),
+                            before[metric] + SLACK_MS)
+                if same_data and now[metric] > limit:
+                    marks.append(f'{metric} было {before[metric]}')
+        regressions += bool(marks)
+        print(f'{name:<14}{now["queries"]:>10}{now["first_ms"]:>14}'
+              f'{now["cold_ms"]:>16}{now["warm_ms"]:>14}  '
+              f'{"; ".join(marks) or "ok"}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--database', required=True,
+                        help='Файл SQLite, заполненный seed_bench_data')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Допустимый рост времени, доля')
+    parser.add_argument('--update-baseline', action='store_true')
+    options = parser.parse_args()
+
+    from django.conf import settings
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+    # Манифест статики строит collectstatic при выкладке, а замеряются
+    # только страницы.
+    settings.STATICFILES_STORAGE = (
+        'django.contrib.staticfiles.storage.StaticFilesStorage')
+    setup_django(os.path.abspath(options.database))
+
+    results = {
+        'dataset': dataset(),
+        'profile': settings.SETTINGS_PROFILE,
+        'views': {},
+    }
+    for name, url, reader in targets():
+        results['views'][name] = measure(url, reader, options.repeat)
+
+    if options.update_baseline or not os.path.exists(options.baseline):
+        with open(options.baseline, 'w', encoding='utf-8') as saved:
+            json.dump(results, saved, ensure_ascii=False, indent=2)
+            saved.write('\n')
+        print(f'Базовый замер записан в {options.baseline}')
+    with open(options.baseline, encoding='utf-8') as saved:
+        baseline = json.load(saved)
+    if compare(results, baseline, options.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
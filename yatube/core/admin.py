@@ -0,0 +1,114 @@
+"""Админка для таблиц в миллионы строк.
+
+Стандартный changelist на каждой странице выполняет COUNT(*) по всей
+таблице (и ещё раз — без фильтров), а иерархия дат перебирает все строки
+функцией усечения даты. LargeTableAdmin оценивает число строк вместо
+точного подсчёта, а даты для иерархии находит перескоками по индексу.
+"""
+import copy
+import datetime
+
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+ESTIMATE_FROM = 10000  # Таблицы меньше этого считаются точно
+FILTERED_COUNT_LIMIT = 100000  # Дальше отфильтрованные строки не считаются
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор changelist без COUNT(*) по всей таблице.
+
+    Без фильтров число строк оценивается по наибольшему первичному ключу —
+    это поиск по индексу; удалённые строки завышают оценку. С фильтрами и
+    поиском строки считаются, но не дальше FILTERED_COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where or queryset.query.distinct:
+            return queryset.order_by()[:FILTERED_COUNT_LIMIT].count()
+        estimate = (
+            queryset.model._base_manager.aggregate(last=Max('pk'))['last']
+            or 0
+        )
+        if estimate < ESTIMATE_FROM:
+            return queryset.count()
+        return estimate
+
+
+def _period_start(day, kind):
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(day, kind):
+    if kind == 'year':
+        return day.replace(year=day.year + 1)
+    if kind == 'month':
+        if day.month == 12:
+            return day.replace(year=day.year + 1, month=1)
+        return day.replace(month=day.month + 1)
+    return day + datetime.timedelta(days=1)
+
+
+def index_dates(queryset, field_name, kind):
+    """То же, что queryset.dates(field_name, kind), но по индексу.
+
+    Каждая следующая дата — MIN(field_name) не раньше начала следующего
+    периода: один поиск по индексу на год, месяц или день вместо прохода
+    по всем строкам.
+    """
+    dates = []
+    rows = queryset
+    while True:
+        first = rows.aggregate(first=Min(field_name))['first']
+        if first is None:
+            return dates
+        is_datetime = isinstance(first, datetime.datetime)
+        if is_datetime and timezone.is_aware(first):
+            first = timezone.localtime(first)
+        day = _period_start(first.date() if is_datetime else first, kind)
+        dates.append(day)
+        boundary = _next_period(day, kind)
+        if is_datetime:
+            boundary = datetime.datetime.combine(boundary, datetime.time())
+            if timezone.is_aware(first):
+                boundary = timezone.make_aware(boundary)
+        rows = queryset.filter(**{f'{field_name}__gte': boundary})
+
+
+class _IndexDates:
+    """Queryset для тега date_hierarchy: dates() ищет даты по индексу."""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def aggregate(self, **aggregates):
+        # SQLite берёт MIN или MAX из индекса, только если агрегат в
+        # запросе один, поэтому каждый считается отдельно.
+        return {
+            name: self.queryset.aggregate(**{name: aggregate})[name]
+            for name, aggregate in aggregates.items()
+        }
+
+    def dates(self, field_name, kind):
+        return index_dates(self.queryset, field_name, kind)
+
+
+def index_dates_changelist(changelist):
+    changelist = copy.copy(changelist)
+    changelist.queryset = _IndexDates(changelist.queryset)
+    return changelist
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/large_change_list.html'
@@ -0,0 +1,98 @@
+"""Кэширование дорогих вычислений без лавины пересчётов.
+
+``get_or_compute`` сочетает три приёма:
+
+* single-flight: пересчитывает только тот, кто взял блокировку
+  ``cache.add``, остальные ждут или отдают старое значение;
+* раннее вероятностное истечение (XFetch): чем ближе конец TTL и чем
+  дороже пересчёт, тем вероятнее, что один из запросов обновит значение
+  заранее;
+* stale-while-revalidate: после TTL значение ещё ``stale_timeout`` секунд
+  отдаётся, пока кто-то один его пересчитывает.
+
+Блокировка держится на ``cache.add`` и работает в пределах одного кэша:
+с LocMemCache — внутри процесса, между воркерами — только с бэкендом, где
+add атомарен: Memcached или DatabaseCache (уникальный ключ в таблице).
+В FileBasedCache add — отдельные проверка и запись, блокировку там могут
+взять два воркера сразу.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+from . import metrics
+
+LOCK_TIMEOUT = 30  # Сколько секунд живёт блокировка пересчёта
+WAIT_INTERVAL = 0.05  # Пауза между проверками, пока пересчитывает другой
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _is_fresh(expires_at, delta, beta):
+    # random() может вернуть 0.0, у которого нет логарифма.
+    gap = -delta * beta * math.log(1.0 - random.random())
+    return time.time() + gap < expires_at
+
+
+def _wait_for(key, cache, lock_timeout):
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(_lock_key(key)) is None:
+            return None
+    return None
+
+
+def _count(name, result):
+    if name is not None:
+        metrics.inc('yatube_cache_requests_total', cache=name, result=result)
+
+
+def get_or_compute(key, compute, timeout, *, stale_timeout=None, beta=1.0,
+                   cache=None, lock_timeout=LOCK_TIMEOUT, name=None):
+    """Значение по ключу; при промахе ``compute()`` вызывается один раз.
+
+    ``stale_timeout`` — сколько секунд после ``timeout`` можно отдавать
+    устаревшее значение (по умолчанию равно ``timeout``). ``beta`` задаёт
+    агрессивность раннего пересчёта: 0 отключает его. С ``name``
+    попадания и промахи считаются в метрике yatube_cache_requests_total.
+    """
+    cache = cache or default_cache
+    if stale_timeout is None:
+        stale_timeout = timeout
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires_at = entry
+        if _is_fresh(expires_at, delta, beta):
+            _count(name, 'hit')
+            return value
+        if not cache.add(_lock_key(key), True, lock_timeout):
+            _count(name, 'stale')
+            return value
+    elif not cache.add(_lock_key(key), True, lock_timeout):
+        entry = _wait_for(key, cache, lock_timeout)
+        if entry is not None:
+            _count(name, 'hit')
+            return entry[0]
+
+    _count(name, 'miss')
+
+    try:
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        cache.set(
+            key,
+            (value, finished - started, finished + timeout),
+            timeout + stale_timeout,
+        )
+    finally:
+        cache.delete(_lock_key(key))
+    return value
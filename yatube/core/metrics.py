@@ -0,0 +1,249 @@
+"""Счётчики и гистограммы задержек в формате Prometheus.
+
+Каждый процесс копит значения в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд записывает снимок в свой файл в
+METRICS_DIR. Эндпоинт /metrics складывает файлы всех процессов, поэтому
+метрики сходятся между воркерами WSGI, хотя LocMemCache у каждого свой.
+Файлы завершившихся процессов collect() под блокировкой каталога
+складывает в общий TOTALS и удаляет, поэтому файлов не больше, чем живых
+процессов. Без fcntl (Windows) файлы только читаются.
+
+Гистограммы лог-линейные, как HDR: на каждую октаву приходится
+SUB_BUCKETS границ, и относительная погрешность квантилей одинакова от
+долей миллисекунды до минуты.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SUB_BUCKETS = 4  # Границ на каждое удвоение
+LOWEST = 0.0005  # Нижняя граница, секунды
+OCTAVES = 17  # Верхняя граница — LOWEST * 2 ** OCTAVES, около 65 секунд
+TOTALS = 'totals.json'  # Сумма снимков завершившихся процессов
+LOCK = '.lock'
+BOUNDS = tuple(
+    LOWEST * 2 ** (step / SUB_BUCKETS)
+    for step in range(OCTAVES * SUB_BUCKETS + 1)
+)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value))
+                              for key, value in labels.items()))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # После fork потомок начинает с нуля и пишет в свой файл.
+        self.pid = os.getpid()
+        self.path_name = f'{self.pid}-{time.time_ns()}.json'
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+
+    def _check_fork(self):
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [
+                    [0] * (len(BOUNDS) + 1), 0.0]
+            histogram[0][bisect.bisect_left(BOUNDS, value)] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, list(labels), list(counts), total]
+                    for (name, labels), (counts, total)
+                    in self.histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        """Записывает снимок процесса в его файл в METRICS_DIR."""
+        now = time.monotonic()
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not force and now - self.last_flush < interval:
+            return
+        self.last_flush = now
+        snapshot = self.snapshot()
+        if not snapshot['counters'] and not snapshot['histograms']:
+            return
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.path_name)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as output:
+            json.dump(snapshot, output)
+        os.replace(temporary, path)
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+atexit.register(registry.flush, force=True)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _finished(file_name):
+    """Файл снимка процесса, который уже завершился."""
+    if file_name == registry.path_name:
+        return False
+    pid, _, _ = file_name.partition('-')
+    return pid.isdigit() and not _alive(int(pid))
+
+
+def _load(path):
+    try:
+        with open(path, encoding='utf-8') as saved:
+            return json.load(saved)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(counters, histograms, snapshot):
+    for name, labels, value in snapshot['counters']:
+        key = name, tuple(map(tuple, labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, counts, total in snapshot['histograms']:
+        key = name, tuple(map(tuple, labels))
+        merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+        merged[0] = [a + b for a, b in zip(merged[0], counts)]
+        merged[1] += total
+
+
+def _fold(directory, finished):
+    """Переносит снимки завершившихся процессов в TOTALS.
+
+    Вызывается под блокировкой каталога: TOTALS заменяется атомарно раньше,
+    чем удаляются сложенные в него файлы.
+    """
+    counters, histograms = {}, {}
+    for file_name in [TOTALS] + finished:
+        snapshot = _load(os.path.join(directory, file_name))
+        if snapshot is not None:
+            _add(counters, histograms, snapshot)
+    path = os.path.join(directory, TOTALS)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as output:
+        json.dump({
+            'counters': [
+                [name, list(labels), value]
+                for (name, labels), value in counters.items()
+            ],
+            'histograms': [
+                [name, list(labels), counts, total]
+                for (name, labels), (counts, total) in histograms.items()
+            ],
+        }, output)
+    os.replace(temporary, path)
+    for file_name in finished:
+        os.remove(os.path.join(directory, file_name))
+
+
+def collect():
+    """Сумма снимков всех процессов: (счётчики, гистограммы)."""
+    registry.flush(force=True)
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return {}, {}
+    if fcntl is None:
+        return _collect(directory)
+    with open(os.path.join(directory, LOCK), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        finished = sorted(
+            file_name for file_name in os.listdir(directory)
+            if file_name.endswith('.json') and _finished(file_name)
+        )
+        if finished:
+            _fold(directory, finished)
+        return _collect(directory)
+
+
+def _collect(directory):
+    counters, histograms = {}, {}
+    for file_name in os.listdir(directory):
+        if not file_name.endswith('.json'):
+            continue
+        snapshot = _load(os.path.join(directory, file_name))
+        if snapshot is not None:
+            _add(counters, histograms, snapshot)
+    return counters, histograms
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    counters, histograms = collect()
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), (counts, total) in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for bound, count in zip(BOUNDS + ('+Inf',), counts):
+            cumulative += count
+            le = bound if bound == '+Inf' else f'{bound:.6g}'
+            lines.append(
+                f'{name}_bucket{_labels(labels, le=le)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {total}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,194 @@
+import json
+import logging
+import mimetypes
+import os
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Заранее сжатые копии статики (core.storage) в порядке предпочтения.
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def _wrap_connections(stack, wrapper):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+class MetricsMiddleware:
+    """Считает запросы, их длительность и SQL по каждому view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            _wrap_connections(stack, counter)
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.inc('yatube_requests_total', view=view,
+                    method=request.method, status=response.status_code)
+        metrics.observe('yatube_request_duration_seconds', elapsed,
+                        view=view)
+        metrics.inc('yatube_db_queries_total', counter.queries, view=view)
+        metrics.registry.flush()
+        return response
+
+
+class RequestProfilingMiddleware:
+    """Считает SQL, время БД, шаблонов и ответа для части запросов.
+
+    Доля запросов задаётся REQUEST_PROFILING_SAMPLE_RATE; остальные
+    проходят без обёрток. Итоги уходят в заголовок Server-Timing и в лог
+    одной JSON-строкой, а повторяющиеся запросы — предупреждением.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        profile = profiling.RequestProfile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            stack.enter_context(profiling.activate(profile))
+            _wrap_connections(stack, profile.execute)
+            response = self.get_response(request)
+        profile.total_time = time.perf_counter() - started
+
+        response['Server-Timing'] = profile.server_timing()
+        self.log(request, response, profile)
+        return response
+
+    def log(self, request, response, profile):
+        duplicates = profile.duplicates(
+            settings.REQUEST_PROFILING_DUPLICATE_THRESHOLD)
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(profile.total_time * 1000, 1),
+            'db_ms': round(profile.db_time * 1000, 1),
+            'template_ms': round(profile.template_time * 1000, 1),
+            'queries': profile.queries,
+            'duplicates': [
+                {'sql': sql, 'count': count} for sql, count in duplicates
+            ],
+        }
+        level = logging.WARNING if duplicates else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False),
+                   extra={'profile': record})
+
+
+def _accepts(header, encoding):
+    """Принимает ли клиент сжатие encoding по заголовку Accept-Encoding."""
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        if name.strip().lower() not in (encoding, '*'):
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику из STATIC_ROOT, не доходя до view.
+
+    Браузеру, который принимает br или gzip, достаётся заранее сжатая
+    копия (core.storage.CompressedManifestStaticFilesStorage). Файлы из
+    манифеста — с хэшем содержимого в имени — кэшируются навсегда
+    (immutable), поэтому повторная загрузка страницы не запрашивает их
+    вовсе; остальные — на STATIC_MAX_AGE секунд.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @cached_property
+    def immutable_names(self):
+        return set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        prefix = settings.STATIC_URL
+        if (request.method not in ('GET', 'HEAD')
+                or not settings.STATIC_ROOT
+                or not request.path.startswith(prefix)):
+            return self.get_response(request)
+        name = request.path[len(prefix):]
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return self.get_response(request)
+        if not os.path.isfile(path):
+            return self.get_response(request)
+        return self.serve(request, name, path)
+
+    def serve(self, request, name, path):
+        content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        encoding = None
+        for candidate, suffix in STATIC_ENCODINGS:
+            if _accepts(accepted, candidate) and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+        stat = os.stat(path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                  stat.st_mtime, stat.st_size):
+            return HttpResponseNotModified()
+
+        response = FileResponse(open(path, 'rb'))
+        # FileResponse угадал бы тип по .gz, а нужен тип исходного файла.
+        response['Content-Type'] = content_type
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if name in self.immutable_names:
+            patch_cache_control(
+                response, public=True, max_age=IMMUTABLE_MAX_AGE,
+                immutable=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=settings.STATIC_MAX_AGE)
+        return response
@@ -0,0 +1,117 @@
+"""Кэш целых страниц с «дырками» под персональные блоки.
+
+Страница рендерится один раз и хранится с ключом из пути, query string и
+версий данных, которые она показывает. Персональные блоки (меню
+пользователя, кнопка подписки, форма комментария) в шаблонах выводятся
+тегом ``{% personal %}``: при рендере для кэша на их месте остаётся
+метка, а при каждой отдаче метки заменяются блоками, отрендеренными для
+текущего пользователя. Анонимам целиком заполненная страница отдаётся
+из отдельного ключа, без рендера шаблонов вовсе.
+
+Всё, что в шаблоне страницы вне ``{% personal %}``, не должно зависеть
+от пользователя.
+"""
+import hashlib
+import re
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import metrics
+from .cache import get_or_compute
+
+HOLES_ATTRIBUTE = '_page_cache_holes'
+MARKER = '<!--personal:{}-->'
+MARKER_PATTERN = re.compile(r'<!--personal:(\d+)-->')
+
+
+class _NotCacheable(Exception):
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+def render_hole(template_name, params, request):
+    return render_to_string(template_name, params, request=request)
+
+
+def hole(request, template_name, params):
+    """Метка вместо блока при рендере для кэша, иначе сам блок."""
+    holes = getattr(request, HOLES_ATTRIBUTE, None)
+    if holes is None:
+        return render_hole(template_name, params, request)
+    holes.append((template_name, params))
+    return mark_safe(MARKER.format(len(holes) - 1))
+
+
+def fill(body, holes, request):
+    return MARKER_PATTERN.sub(
+        lambda match: render_hole(*holes[int(match.group(1))], request),
+        body,
+    )
+
+
+def _key(request, version):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return 'page:{}:{}'.format(path, ':'.join(map(str, version)))
+
+
+def _render(view, request, args, kwargs):
+    setattr(request, HOLES_ATTRIBUTE, [])
+    try:
+        response = view(request, *args, **kwargs)
+        holes = getattr(request, HOLES_ATTRIBUTE)
+    finally:
+        delattr(request, HOLES_ATTRIBUTE)
+    if response.status_code != 200 or response.streaming:
+        raise _NotCacheable(response)
+    return response.content.decode(response.charset), holes
+
+
+def cache_page(version):
+    """Декоратор view: кэширует страницу с дырками для всех посетителей.
+
+    ``version(**kwargs)`` по аргументам из URL возвращает список версий
+    данных страницы (поколения лент) или None, если кэшировать нельзя —
+    тогда запрос обрабатывает сам view. PAGE_CACHE_TIMEOUT = 0 отключает
+    кэш.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.PAGE_CACHE_TIMEOUT
+            if not timeout or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_version = version(**kwargs)
+            if page_version is None:
+                return view(request, *args, **kwargs)
+            key = _key(request, page_version)
+            anonymous_key = f'{key}:anonymous'
+
+            anonymous = not request.user.is_authenticated
+            if anonymous:
+                html = cache.get(anonymous_key)
+                metrics.inc('yatube_cache_requests_total',
+                            cache='anonymous_page',
+                            result='miss' if html is None else 'hit')
+                if html is not None:
+                    return HttpResponse(html)
+            try:
+                body, holes = get_or_compute(
+                    key,
+                    partial(_render, view, request, args, kwargs),
+                    timeout,
+                    name='page',
+                )
+            except _NotCacheable as error:
+                return error.response
+            html = fill(body, holes, request)
+            if anonymous:
+                cache.set(anonymous_key, html, timeout)
+            return HttpResponse(html)
+        return wrapper
+    return decorator
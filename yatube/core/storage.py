@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:  # Brotli не установлен: статика сжимается только в gzip
+    brotli = None
+
+# Картинки и шрифты уже сжаты, второй раз их сжимать бесполезно.
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.map', '.svg', '.ico', '.json', '.txt', '.xml', '.html',
+}
+MIN_COMPRESSED_SAVING = 0.05  # Меньшая экономия не стоит отдельного файла
+
+
+class AlreadyStored(Exception):
+    """Файл с таким содержимым уже лежит в хранилище."""
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — SHA-256 его содержимого.
+
+    Файл ``posts/photo.jpg`` сохраняется как ``posts/ab/cd/abcd….jpg``.
+    Повторная загрузка той же картинки не пишет на диск ничего и получает
+    то же имя, поэтому и миниатюры sorl для неё уже готовы. Содержимое по
+    такому имени никогда не меняется, его можно отдавать с
+    ``Cache-Control: immutable``.
+
+    Удалять файл можно, только когда на него не ссылается ни одна запись:
+    это решает вызывающий код (см. posts.thumbnails.release).
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], f'{digest}{extension}'
+        ).replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        if self.exists(name):
+            raise AlreadyStored(name)
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        try:
+            return self._save(self.get_available_name(name), content)
+        except AlreadyStored:
+            return name
+
+
+def _compressors():
+    yield '.gz', lambda data: gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хэшем в имени и заранее сжатыми копиями рядом.
+
+    После обработки ManifestStaticFilesStorage collectstatic кладёт рядом
+    с каждым текстовым файлом ``.gz`` и ``.br``, а
+    core.middleware.StaticFilesMiddleware отдаёт их браузерам, которые
+    такое сжатие принимают. Сжатие на максимальном уровне делается один
+    раз при сборке, а не на каждый запрос.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        for suffix, compress in _compressors():
+            # Старая копия от прошлой сборки не должна пережить новую.
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            compressed = compress(data)
+            if len(compressed) <= len(data) * (1 - MIN_COMPRESSED_SAVING):
+                self._save(name + suffix, ContentFile(compressed))
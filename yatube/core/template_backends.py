@@ -0,0 +1,27 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from . import profiling
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with profiling.measure_template():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный бэкенд, который засекает время отрисовки шаблонов.
+
+    Замеряется только внешний render(): include и inclusion-теги
+    отрисовываются внутри него и второй раз не считаются.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,22 @@
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+
+from core.admin import index_dates_changelist
+
+register = template.Library()
+
+
+def index_date_hierarchy(cl):
+    return date_hierarchy(index_dates_changelist(cl))
+
+
+@register.tag(name='index_date_hierarchy')
+def index_date_hierarchy_tag(parser, token):
+    """{% date_hierarchy cl %}, который ищет даты по индексу."""
+    return InclusionAdminNode(
+        parser, token,
+        func=index_date_hierarchy,
+        template_name='date_hierarchy.html',
+        takes_context=False,
+    )
@@ -0,0 +1,17 @@
+from django import template
+
+from core.page_cache import hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, template_name, **params):
+    """{% personal 'template.html' key=value %} — блок для пользователя.
+
+    Блок рендерится отдельно, только с params и контекст-процессорами,
+    поэтому кэш страницы (core.page_cache) подставляет его заново на
+    каждый запрос. Параметры должны быть простыми значениями: они
+    хранятся в кэше вместе со страницей.
+    """
+    return hole(context.get('request'), template_name, params)
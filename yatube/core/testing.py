@@ -0,0 +1,109 @@
+"""Бюджет SQL-запросов для тестов.
+
+query_budget работает и как контекстный менеджер, и как декоратор:
+
+    with query_budget(4):
+        self.client.get(url)
+
+    @query_budget(4, duplicates=1)
+    def test_index(self):
+        ...
+
+Тест падает, если запросов больше queries или один и тот же запрос (с
+точностью до параметров) выполнен больше duplicates раз — так N+1
+ловится даже тогда, когда общий бюджет ещё не исчерпан.
+
+run_on_commit выполняет колбэки transaction.on_commit, добавленные внутри
+блока: транзакция TestCase не коммитится, и без него они бы не
+выполнились.
+
+TestRunner (TEST_RUNNER) пишет метрики тестов во временный каталог, а не
+в общий METRICS_DIR, и не выводит INFO-записи профилировщика о каждом
+запросе тестов.
+"""
+import logging
+import shutil
+import tempfile
+from contextlib import ContextDecorator, ExitStack, contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import metrics
+from .profiling import RequestProfile
+
+DUPLICATES = 1  # По умолчанию каждый запрос выполняется один раз
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    def __init__(self, queries, duplicates=DUPLICATES, using=None):
+        self.queries = queries
+        self.duplicates = duplicates
+        self.using = using
+
+    def __enter__(self):
+        self.profile = RequestProfile()
+        self._stack = ExitStack()
+        aliases = [self.using] if self.using else connections
+        for alias in aliases:
+            self._stack.enter_context(
+                connections[alias].execute_wrapper(self.profile.execute))
+        return self.profile
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        if exc_type is not None:
+            return False
+        problems = []
+        if self.profile.queries > self.queries:
+            problems.append(
+                f'запросов {self.profile.queries}, бюджет {self.queries}')
+        duplicates = self.profile.duplicates(self.duplicates + 1)
+        problems.extend(
+            f'повторов {count}: {sql}' for sql, count in duplicates)
+        if problems:
+            statements = '\n'.join(
+                f'  {count} × {sql}'
+                for sql, count in self.profile.statements.items()
+            )
+            raise QueryBudgetExceeded(
+                '\n'.join(problems) + '\nВыполненные запросы:\n'
+                + statements)
+        return False
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Как captureOnCommitCallbacks(execute=True) из Django 3.2."""
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    # Колбэк может сам добавить новые — выполняются и они.
+    while len(connection.run_on_commit) > start:
+        _, callback = connection.run_on_commit.pop(start)
+        callback()
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp(prefix='yatube-metrics-')
+        self.metrics_settings = override_settings(
+            METRICS_DIR=self.metrics_dir)
+        self.metrics_settings.enable()
+        self.profiling_logger = logging.getLogger('core.middleware')
+        self.profiling_level = self.profiling_logger.level
+        self.profiling_logger.setLevel(logging.WARNING)
+
+    def teardown_test_environment(self, **kwargs):
+        # Иначе atexit допишет снимок тестов в настоящий METRICS_DIR.
+        self.profiling_logger.setLevel(self.profiling_level)
+        metrics.registry._reset()
+        self.metrics_settings.disable()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
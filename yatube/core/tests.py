@@ -1,6 +1,33 @@
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from unittest import mock
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from core import metrics
+from core.cache import _lock_key, get_or_compute
+from core.middleware import RequestProfilingMiddleware, StaticFilesMiddleware
+from core.signals import tune_sqlite
+from core.storage import ContentAddressedStorage
+from core.testing import QueryBudgetExceeded, query_budget
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +35,389 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist_page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class GetOrComputeTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once(self):
+        """Пока значение свежее, оно не пересчитывается"""
+        for _ in range(3):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_miss_computes_once(self):
+        """Одновременный промах пересчитывает значение один раз"""
+        def slow_compute():
+            time.sleep(0.2)
+            return self.compute()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute('key', slow_compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_recomputing(self):
+        """Устаревшее значение отдаётся, пока его пересчитывает другой"""
+        get_or_compute('key', self.compute, 60)
+        cache.add(_lock_key('key'), True)
+        with mock.patch('core.cache.time.time', return_value=time.time() + 90):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_value_recomputed_by_lock_owner(self):
+        """После TTL значение пересчитывает получивший блокировку"""
+        get_or_compute('key', self.compute, 60)
+        with mock.patch('core.cache.time.time', return_value=time.time() + 90):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 2)
+        self.assertIsNone(cache.get(_lock_key('key')))
+
+    def test_early_expiration(self):
+        """Дорогое значение пересчитывается раньше конца TTL"""
+        cache.set('key', ('old', 30.0, time.time() + 10), 120)
+        self.assertEqual(
+            get_or_compute('key', self.compute, 60, beta=0), 'old')
+        with mock.patch('core.cache.random.random', return_value=0.9):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+
+    def test_lock_released_on_error(self):
+        """Ошибка пересчёта не оставляет блокировку"""
+        def broken():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            get_or_compute('key', broken, 60)
+        self.assertIsNone(cache.get(_lock_key('key')))
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def test_name_is_content_hash(self):
+        """Имя файла строится из SHA-256 содержимого"""
+        digest = hashlib.sha256(b'picture').hexdigest()
+        name = self.storage.save('posts/Photo.JPG', ContentFile(b'picture'))
+        self.assertEqual(name, f'posts/{digest[:2]}/{digest[2:4]}/'
+                               f'{digest}.jpg')
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'picture')
+
+    def test_duplicate_upload_is_stored_once(self):
+        """Одинаковое содержимое сохраняется один раз"""
+        first = self.storage.save('posts/a.jpg', ContentFile(b'picture'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        files = [
+            name for _, _, names in os.walk(self.location) for name in names
+        ]
+        self.assertEqual(len(files), 2)
+
+
+@override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0,
+                   REQUEST_PROFILING_DUPLICATE_THRESHOLD=3)
+class RequestProfilingMiddlewareTest(TestCase):
+    def test_server_timing_header(self):
+        """Ответ получает Server-Timing с БД, шаблонами и общим временем"""
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get('/')
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['duplicates'], [])
+        self.assertGreater(record['template_ms'], 0)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_profiled(self):
+        """Без выборки запрос проходит без замеров"""
+        response = self.client.get('/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_repeated_queries_are_flagged(self):
+        """Повторяющийся запрос попадает в лог как N+1"""
+        user_model = get_user_model()
+
+        def view(request):
+            for pk in range(4):
+                user_model.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        middleware = RequestProfilingMiddleware(view)
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 4)
+        self.assertEqual(record['duplicates'][0]['count'], 4)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        overridden = override_settings(METRICS_DIR=self.directory)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        metrics.registry._reset()
+        self.addCleanup(metrics.registry._reset)
+        cache.clear()
+
+    def test_histogram_buckets_are_log_linear(self):
+        """Соседние границы гистограммы отличаются в постоянное число раз"""
+        ratios = {
+            round(upper / lower, 9)
+            for lower, upper in zip(metrics.BOUNDS, metrics.BOUNDS[1:])
+        }
+        self.assertEqual(ratios, {round(2 ** (1 / metrics.SUB_BUCKETS), 9)})
+
+    def test_snapshots_of_processes_are_summed(self):
+        """Эндпоинт складывает метрики всех процессов"""
+        metrics.inc('yatube_test_total', kind='a')
+        metrics.observe('yatube_test_seconds', 0.01)
+        other = {
+            'counters': [['yatube_test_total', [['kind', 'a']], 2]],
+            'histograms': [],
+        }
+        with open(os.path.join(self.directory, '1-1.json'), 'w') as saved:
+            json.dump(other, saved)
+
+        text = metrics.render()
+        self.assertIn('yatube_test_total{kind="a"} 3', text)
+        self.assertIn('yatube_test_seconds_bucket{le="0.0005"} 0', text)
+        self.assertIn('yatube_test_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('yatube_test_seconds_count 1', text)
+
+    def test_snapshots_of_finished_processes_are_folded(self):
+        """Файлы завершившихся процессов складываются в один и удаляются"""
+        snapshot = {
+            'counters': [['yatube_test_total', [], 2]],
+            'histograms': [],
+        }
+        for file_name in ('999999991-1.json', '999999992-1.json'):
+            with open(os.path.join(self.directory, file_name), 'w') as saved:
+                json.dump(snapshot, saved)
+        metrics.inc('yatube_test_total')
+
+        for _ in range(2):
+            self.assertIn('yatube_test_total 5', metrics.render())
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory)
+                   if name.endswith('.json')),
+            sorted([metrics.TOTALS, metrics.registry.path_name]))
+
+    def test_metrics_endpoint(self):
+        """/metrics отдаёт запросы, SQL и попадания в кэш ленты"""
+        self.client.get('/')
+        self.client.get('/')
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('yatube_requests_total{method="GET",status="200",'
+                      'view="posts:index"} 2', text)
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', text)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="posts:index"} 2', text)
+        self.assertIn('yatube_cache_requests_total{cache="index_page",'
+                      'result="miss"} 1', text)
+        self.assertIn('yatube_cache_requests_total{cache="index_page",'
+                      'result="hit"} 1', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_is_internal(self):
+        """Метрики доступны только по токену и персоналу"""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = self.client.get(
+                    '/metrics', REMOTE_ADDR='127.0.0.1', **headers)
+                self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        staff = get_user_model().objects.create_user(
+            username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics').status_code,
+                         HTTPStatus.OK)
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        for num in range(3):
+            User.objects.create_user(username=f'user{num}')
+
+    def test_within_budget(self):
+        """Запросы в пределах бюджета проходят"""
+        with query_budget(1) as profile:
+            list(get_user_model().objects.all())
+        self.assertEqual(profile.queries, 1)
+
+    def test_over_budget(self):
+        """Лишний запрос роняет тест"""
+        User = get_user_model()
+        with self.assertRaisesMessage(QueryBudgetExceeded,
+                                      'запросов 2, бюджет 1'):
+            with query_budget(1):
+                User.objects.count()
+                User.objects.exists()
+
+    def test_duplicates(self):
+        """Повтор одного запроса — N+1, даже если бюджет не исчерпан"""
+        User = get_user_model()
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'повторов 3'):
+            with query_budget(10):
+                for user in User.objects.values_list('pk', flat=True):
+                    User.objects.get(pk=user)
+        with query_budget(10, duplicates=3):
+            for user in User.objects.values_list('pk', flat=True):
+                User.objects.get(pk=user)
+
+    def test_decorator(self):
+        """query_budget работает и как декоратор"""
+        @query_budget(0)
+        def count():
+            return get_user_model().objects.count()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            count()
+
+
+class SettingsProfileTest(SimpleTestCase):
+    def load_prod(self, **environ):
+        sys.modules.pop('yatube.settings.prod', None)
+        with mock.patch.dict(os.environ, environ, clear=True):
+            return importlib.import_module('yatube.settings.prod')
+
+    def test_prod_profile(self):
+        """В prod нет debug_toolbar, шаблоны кэшируются, соединения живут"""
+        prod = self.load_prod(SECRET_KEY='secret')
+        self.assertFalse(prod.DEBUG)
+        self.assertNotIn('debug_toolbar', prod.INSTALLED_APPS)
+        self.assertNotIn('debug_toolbar.middleware.DebugToolbarMiddleware',
+                         prod.MIDDLEWARE)
+        loader, _ = prod.TEMPLATES[0]['OPTIONS']['loaders'][0]
+        self.assertEqual(loader, 'django.template.loaders.cached.Loader')
+        self.assertGreater(prod.DATABASES['default']['CONN_MAX_AGE'], 0)
+        self.assertEqual(prod.SQLITE_PRAGMAS['journal_mode'], 'WAL')
+        self.assertEqual(prod.MIDDLEWARE[0],
+                         'core.middleware.StaticFilesMiddleware')
+
+    def test_prod_requires_secret_key(self):
+        """prod не запускается с ключом по умолчанию"""
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_prod()
+
+
+class SqlitePragmasTest(TestCase):
+    def cache_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connection(self):
+        """PRAGMA из настроек выполняются на соединении"""
+        default = self.cache_size()
+        with override_settings(SQLITE_PRAGMAS={'cache_size': -1234}):
+            tune_sqlite(None, connection)
+        size = self.cache_size()
+        with override_settings(SQLITE_PRAGMAS={'cache_size': default}):
+            tune_sqlite(None, connection)
+        self.assertEqual(size, -1234)
+
+
+class StaticFilesTest(SimpleTestCase):
+    STYLES = b'body { color: black; }\n' * 100
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.source = tempfile.mkdtemp()
+        cls.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.source, 'css'))
+        with open(os.path.join(cls.source, 'css', 'site.css'), 'wb') as file:
+            file.write(cls.STYLES)
+        cls.settings = override_settings(
+            STATICFILES_DIRS=[cls.source],
+            STATIC_ROOT=cls.root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'),
+        )
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed = staticfiles_storage.stored_name('css/site.css')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.source, ignore_errors=True)
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, name, **headers):
+        request = RequestFactory().get('/static/' + name, **headers)
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse())
+        return middleware(request)
+
+    def test_collectstatic_writes_compressed_copies(self):
+        """Рядом с файлом с хэшем в имени лежит его gzip-копия"""
+        self.assertNotEqual(self.hashed, 'css/site.css')
+        with open(os.path.join(self.root, self.hashed + '.gz'), 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), self.STYLES)
+
+    def test_serves_precompressed_immutable(self):
+        """Файл с хэшем отдаётся сжатым и кэшируется навсегда"""
+        response = self.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            self.STYLES)
+
+    def test_serves_plain_without_accept_encoding(self):
+        """Без Accept-Encoding или с q=0 файл отдаётся как есть"""
+        for accepted in ('', 'gzip;q=0, identity'):
+            with self.subTest(accepted=accepted):
+                response = self.get(
+                    self.hashed, HTTP_ACCEPT_ENCODING=accepted)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(
+                    b''.join(response.streaming_content), self.STYLES)
+
+    def test_unhashed_name_is_not_immutable(self):
+        """Файл без хэша в имени кэшируется на STATIC_MAX_AGE"""
+        response = self.get('css/site.css')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        response.close()
+
+    def test_missing_and_outside_files_fall_through(self):
+        """Чужие пути и файлы вне STATIC_ROOT отдаёт обычный обработчик"""
+        for name in ('css/missing.css', '../' + os.path.basename(self.source)):
+            with self.subTest(name=name):
+                self.assertIsInstance(self.get(name), HttpResponse)
@@ -1,10 +1,14 @@
 from django.contrib import admin
+from django.db.models import Q
 
-from .models import Comment, Follow, Group, Post
+from core.admin import LargeTableAdmin
+
+from . import search
+from .models import Comment, Follow, Group, Post, Profile, User
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,31 +16,71 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        match = search.to_match(search_term)
+        if not match or not search.is_available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.filter(pk__in=search.matching(match)), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
+    search_fields = ('title',)
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
         'author',
         'post',
     )
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
     search_fields = ('text',)
-    list_filter = ('author',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('pk', 'author', 'user',)
-    list_filter = ('user', 'author',)
+    list_select_related = ('author', 'user')
+    autocomplete_fields = ('author', 'user')
+    # Поиск по точному логину вместо фильтров в боковой панели, которые
+    # загружали всех пользователей.
+    search_fields = ('=user__username', '=author__username')
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # Сначала логин, потом подписки по индексам user и author, без
+        # JOIN по всей таблице подписок.
+        user_ids = list(User.objects.filter(
+            username=search_term.strip()).values_list('pk', flat=True))
+        return queryset.filter(
+            Q(user__in=user_ids) | Q(author__in=user_ids)), False
+
+
+@admin.register(Profile)
+class ProfileAdmin(LargeTableAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+        'comments_count',
+        'followers_count',
+        'following_count',
+    )
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
@@ -0,0 +1,131 @@
+"""Потоковая выгрузка постов, комментариев и подписок в NDJSON.
+
+Строки читаются через values().iterator(), поэтому память не растёт с
+размером базы. Каждая строка — JSON-объект с полем ``type``; внутри типа
+строки идут по возрастанию id. У id каждого типа своя последовательность,
+поэтому водяные знаки тоже свои: ``since`` вида ``post:123,comment:456``.
+Последняя строка выгрузки — ``{"type": "watermark", "since": ...}`` с
+последним id каждого типа; прерванную выгрузку продолжают с последних
+полученных id.
+"""
+import json
+import zlib
+from datetime import date, datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Comment, Follow, Post
+
+CHUNK_SIZE = 2000
+WATERMARK = 'watermark'  # Тип итоговой строки с водяными знаками
+
+# Тип строки: (модель, выгружаемые поля, поле даты для водяного знака)
+TYPES = {
+    'post': (
+        Post,
+        ('id', 'author_id', 'group_id', 'text', 'pub_date', 'image'),
+        'pub_date',
+    ),
+    'comment': (
+        Comment,
+        ('id', 'post_id', 'author_id', 'text', 'created'),
+        'created',
+    ),
+    'follow': (Follow, ('id', 'user_id', 'author_id'), None),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_types(value):
+    """Типы из строки вида ``post,comment``; пустая строка — все типы."""
+    if not value:
+        return list(TYPES)
+    types = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = set(types) - set(TYPES)
+    if unknown:
+        raise ExportError(f'Неизвестные типы: {", ".join(sorted(unknown))}')
+    return types
+
+
+def parse_since(value):
+    """Водяные знаки {тип: id} из строки вида ``post:123,comment:456``."""
+    since = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, last_id = item.partition(':')
+        if name not in TYPES:
+            raise ExportError(f'Неизвестный тип: {name}')
+        try:
+            since[name] = int(last_id)
+        except ValueError:
+            raise ExportError(f'Некорректный id: {item}')
+    return since
+
+
+def format_since(since):
+    """Строка для параметра since из водяных знаков {тип: id}."""
+    return ','.join(
+        f'{name}:{since[name]}' for name in TYPES if name in since)
+
+
+def parse_since_date(value):
+    """Дата или дата со временем в ISO 8601."""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = day and datetime.combine(day, datetime.min.time())
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ExportError(f'Некорректная дата: {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        # Микросекунды сохраняем: по дате продолжают выгрузку.
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def rows(types=None, since=None, since_date=None, chunk_size=CHUNK_SIZE):
+    """Строки выгрузки в виде словарей, последней — водяные знаки.
+
+    since — {тип: id}, отбрасывает записи типа с id не больше указанного;
+    since_date — записи старше даты (у подписок даты нет, для них
+    действует только since).
+    """
+    since = dict(since or {})
+    for name in types or TYPES:
+        model, fields, date_field = TYPES[name]
+        queryset = model.objects.order_by('pk')
+        if name in since:
+            queryset = queryset.filter(pk__gt=since[name])
+        if since_date is not None and date_field is not None:
+            queryset = queryset.filter(**{f'{date_field}__gte': since_date})
+        for row in queryset.values(*fields).iterator(chunk_size=chunk_size):
+            since[name] = row['id']
+            yield {'type': name, **row}
+    yield {'type': WATERMARK, 'since': format_since(since)}
+
+
+def lines(**kwargs):
+    for row in rows(**kwargs):
+        yield (json.dumps(row, ensure_ascii=False, default=_default)
+               + '\n').encode()
+
+
+def gzipped(chunks):
+    """Сжимает поток байтов в gzip, не собирая его в памяти."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,61 @@
+"""Подписки пользователя: множество авторов в кэше.
+
+Множество id авторов, на которых подписан пользователь, читается из кэша
+один раз за запрос и запоминается на объекте пользователя, поэтому любые
+проверки подписки в шаблонах стоят O(1) и не ходят в базу. Сигналы
+Follow сбрасывают кэш сразу и ещё раз после коммита: иначе запрос,
+прочитавший базу до коммита, оставил бы в кэше старое множество.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+ATTRIBUTE = '_followees'
+
+
+def _key(user_id):
+    return f'followees:{user_id}'
+
+
+def _author_id(author):
+    return getattr(author, 'pk', author)
+
+
+def followees(user):
+    """frozenset id авторов, на которых подписан пользователь."""
+    if not user.is_authenticated:
+        return frozenset()
+    found = getattr(user, ATTRIBUTE, None)
+    if found is not None:
+        return found
+    found = cache.get(_key(user.pk))
+    if found is None:
+        found = frozenset(
+            Follow.objects.filter(user_id=user.pk)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(_key(user.pk), found, settings.FOLLOW_GRAPH_TIMEOUT)
+    setattr(user, ATTRIBUTE, found)
+    return found
+
+
+def is_following(user, author):
+    """Подписан ли user на author (объект или id)."""
+    return _author_id(author) in followees(user)
+
+
+def following_many(user, authors):
+    """{id автора: подписан ли} для многих авторов за одно чтение кэша."""
+    found = followees(user)
+    return {
+        author_id: author_id in found
+        for author_id in map(_author_id, authors)
+    }
+
+
+def invalidate(user_id):
+    key = _key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
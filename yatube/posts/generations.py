@@ -0,0 +1,99 @@
+"""Поколения лент для версионирования ключей кэша.
+
+Ключ фрагмента ленты включает номер поколения, который сдвигается при
+каждом изменении поста. Старые фрагменты после этого просто не читаются и
+вытесняются по TTL, поэтому TTL можно держать длинным. Теми же
+поколениями версионируются целые страницы (core.page_cache), поэтому
+поколение автора сдвигают и подписки, и комментарии, меняющие его
+счётчики.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+INDEX = 'index'
+
+
+def group(group_id):
+    return f'group:{group_id}'
+
+
+def author(author_id):
+    return f'author:{author_id}'
+
+
+def _key(scope):
+    return f'feed_generation:{scope}'
+
+
+def _initial():
+    # Начальное значение из часов: поколение, потерянное при вытеснении,
+    # не совпадёт ни с одним из уже выданных.
+    return time.time_ns()
+
+
+def get(scope):
+    key = _key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_many(scopes):
+    """Поколения нескольких лент за одно обращение к кэшу."""
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    generations = {keys[key]: value for key, value in found.items()}
+    for scope in set(scopes) - set(generations):
+        generations[scope] = get(scope)
+    return generations
+
+
+def versions(*scopes):
+    """Поколения лент списком — версия страницы для core.page_cache."""
+    found = get_many(scopes)
+    return [found[scope] for scope in scopes]
+
+
+def _bump_now(scopes):
+    # Новое значение из часов вместо incr: incr атомарен не во всех
+    # бэкендах (DatabaseCache читает и пишет отдельно), а записанное
+    # поколение отличается от старого при любом исходе гонки.
+    cache.set_many({_key(scope): _initial() for scope in scopes}, None)
+
+
+def bump(*scopes):
+    """Сдвигает поколения лент после коммита текущей транзакции.
+
+    Запрос, пришедший между сдвигом и коммитом, отрендерил бы ещё старые
+    данные и положил бы их в кэш под новым ключом. Вне транзакции
+    поколения сдвигаются сразу.
+    """
+    scopes = tuple(scopes)
+    transaction.on_commit(lambda: _bump_now(scopes))
+
+
+def post_scopes(post, previous_group_id=None):
+    """Ленты, в которых показывается пост."""
+    scopes = {INDEX, author(post.author_id)}
+    for group_id in (post.group_id, previous_group_id):
+        if group_id is not None:
+            scopes.add(group(group_id))
+    return scopes
+
+
+def follow_scopes(follow):
+    """Страницы со счётчиками подписок обоих пользователей."""
+    return {author(follow.user_id), author(follow.author_id)}
+
+
+def context(scope):
+    """Переменные шаблона для тега {% cache %} ленты."""
+    return {
+        'feed_version': get(scope),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,465 @@
+"""Пакетный импорт постов, комментариев и подписок из NDJSON и CSV.
+
+Формат строк совпадает с выгрузкой posts.export: у каждой строки есть
+``type``, итоговая строка с водяными знаками пропускается. Авторов и
+группы можно указывать по id (``author_id``, ``group_id``) или по имени
+и slug (``author``, ``group``): имена разрешаются через словарь в
+памяти, недостающие пользователи и группы создаются. id постов и
+комментариев сохраняются, поэтому повторная вставка той же пачки ничего
+не меняет.
+
+Перед вставкой строки пачки проверяются: ссылки на пользователей,
+группы и посты должны существовать, обязательные поля — быть заполнены.
+Строки с ошибками пропускаются и попадают в отчёт, строки с уже
+существующими id — считаются отдельно. Остальное пишется через
+bulk_create пачками, каждая пачка — в своей транзакции; после неё номер
+обработанной строки сохраняется в файл контрольной точки, и после
+падения импорт продолжается с него. Сигналы при bulk_create не
+срабатывают, поэтому счётчики затронутых пользователей, поисковый
+индекс новых постов, ленты подписок и поколения кэша обновляются в
+finalize().
+"""
+import csv
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import export, generations, search, stats, timeline
+from .models import Comment, Follow, Group, Post, User
+from .utils import batches
+
+BATCH_SIZE = 1000
+IMAGE_WORKERS = 8
+REPORTED_SKIPS = 20  # Сколько пропущенных строк перечислять в отчёте
+EXISTS = object()  # Строка уже записана прошлым запуском
+
+
+class ImportDataError(ValueError):
+    pass
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(path, default_type=None):
+    """Строки файла по одной, как пары (тип, словарь полей)."""
+    is_csv = path.replace('.gz', '').endswith('.csv')
+    with _open(path) as source:
+        if is_csv:
+            records = (
+                {key: value or None for key, value in record.items()}
+                for record in csv.DictReader(source)
+            )
+        else:
+            records = (json.loads(line) for line in source if line.strip())
+        for number, record in enumerate(records, start=1):
+            kind = record.pop('type', None) or default_type
+            if kind == export.WATERMARK:
+                continue
+            if kind not in export.TYPES:
+                raise ImportDataError(
+                    f'Строка {number}: неизвестный тип {kind!r}')
+            yield kind, record
+
+
+def _parse_datetime(value):
+    if not value:
+        return timezone.now()
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ImportDataError(f'Некорректная дата: {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _create_user(username):
+    return User.objects.create_user(username=username)
+
+
+def _create_group(slug):
+    return Group.objects.create(title=slug, slug=slug, description='')
+
+
+@contextmanager
+def _keep_dates(model, date_field):
+    """Пока открыт блок, auto_now_add не подменяет дату из файла.
+
+    Меняет поле модели для всего процесса, поэтому годится только для
+    команды импорта, где модели больше никто не сохраняет.
+    """
+    field = model._meta.get_field(date_field)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _insert(model, objects, date_field=None):
+    """bulk_create уже проверенных строк, с датой из файла.
+
+    Без ignore_conflicts: строки проверены заранее, и нарушение
+    ограничения должно остановить импорт, а не пропасть молча.
+    """
+    if not objects:
+        return
+    if date_field is None:
+        model.objects.bulk_create(objects)
+        return
+    with _keep_dates(model, date_field):
+        model.objects.bulk_create(objects)
+
+
+def _existing(model, ids):
+    """Множество id из ids, которые уже есть в таблице."""
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return set()
+    return set(
+        model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+class Lookup:
+    """Соответствие имени id записи; недостающие записи создаются."""
+
+    def __init__(self, model, field, create):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.ids = {}
+
+    def resolve(self, names):
+        missing = {name for name in names if name and name not in self.ids}
+        if not missing:
+            return
+        self.ids.update(
+            self.model.objects.filter(**{f'{self.field}__in': missing})
+            .values_list(self.field, 'pk')
+        )
+        for name in missing - set(self.ids):
+            self.ids[name] = self.create(name).pk
+
+    def id_for(self, record, name_key):
+        """id из поля ``<name_key>_id`` либо по имени из ``<name_key>``."""
+        pk = record.get(f'{name_key}_id')
+        if pk is not None:
+            return int(pk)
+        name = record.get(name_key)
+        return self.ids[name] if name else None
+
+
+class Checkpoint:
+    """Файл с номером последней записанной строки и затронутыми записями."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {'rows': 0}
+        with open(self.path, encoding='utf-8') as saved:
+            state = json.load(saved)
+        if state.get('source') != self.source:
+            raise ImportDataError(
+                f'Контрольная точка {self.path} относится к другому файлу')
+        return state
+
+    def save(self, rows, **touched):
+        state = {
+            'source': self.source,
+            'rows': rows,
+            **{
+                name: sorted(ids) if isinstance(ids, set) else ids
+                for name, ids in touched.items()
+            },
+        }
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as saved:
+            json.dump(state, saved)
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Importer:
+    def __init__(self, batch_size=BATCH_SIZE, media_source=None,
+                 workers=IMAGE_WORKERS, progress=None):
+        self.batch_size = batch_size
+        self.media_source = media_source
+        self.workers = workers
+        self.progress = progress
+        self.users = Lookup(User, 'username', _create_user)
+        self.groups = Lookup(Group, 'slug', _create_group)
+        self.buffers = {kind: [] for kind in export.TYPES}
+        self.authors = set()
+        self.group_ids = set()
+        self.post_ids = set()
+        # Пользователи, чьи счётчики изменил импорт.
+        self.counted_users = set()
+        self.missing_images = 0
+        self.existing = 0
+        self.skipped = 0
+        self.skipped_rows = []
+        self.executor = None
+
+    def run(self, rows, checkpoint=None):
+        """Импортирует строки; возвращает число обработанных строк."""
+        state = checkpoint.load() if checkpoint else {'rows': 0}
+        skip = state['rows']
+        self.authors.update(state.get('authors', ()))
+        self.group_ids.update(state.get('groups', ()))
+        self.post_ids.update(state.get('posts', ()))
+        self.counted_users.update(state.get('users', ()))
+        self.existing = state.get('existing', 0)
+        self.skipped = state.get('skipped', 0)
+        processed = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as self.executor:
+            for kind, record in rows:
+                processed += 1
+                if processed <= skip:
+                    continue
+                buffer = self.buffers[kind]
+                buffer.append((processed, record))
+                if len(buffer) >= self.batch_size:
+                    self._commit(processed, skip, started, checkpoint)
+            self._commit(processed, skip, started, checkpoint)
+        return processed
+
+    def _commit(self, processed, skip, started, checkpoint):
+        self.flush()
+        if checkpoint:
+            checkpoint.save(
+                processed,
+                authors=self.authors,
+                groups=self.group_ids,
+                posts=self.post_ids,
+                users=self.counted_users,
+                existing=self.existing,
+                skipped=self.skipped,
+            )
+        if self.progress:
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.progress(processed, (processed - skip) / elapsed)
+
+    def _skip(self, number, reason):
+        self.skipped += 1
+        if len(self.skipped_rows) < REPORTED_SKIPS:
+            self.skipped_rows.append((number, reason))
+
+    def _valid(self, entries, problem):
+        """Объекты, для которых problem(obj) не нашла ошибки.
+
+        Объекты с уже существующим id пропускаются без ошибки: это строки,
+        записанные прошлым запуском.
+        """
+        valid = []
+        for number, obj in entries:
+            reason = problem(obj)
+            if reason == EXISTS:
+                self.existing += 1
+            elif reason:
+                self._skip(number, reason)
+            else:
+                valid.append(obj)
+        return valid
+
+    def flush(self):
+        # Пачки пишутся в порядке зависимостей: комментарии ссылаются на
+        # посты, поэтому посты из того же окна файла вставляются раньше.
+        posts = self._build_posts(self.buffers['post'])
+        comments = self._build_comments(
+            self.buffers['comment'], {post.pk for post in posts})
+        follows = self._build_follows(self.buffers['follow'])
+        with transaction.atomic():
+            _insert(Post, posts, 'pub_date')
+            _insert(Comment, comments, 'created')
+            _insert(Follow, follows)
+        for post in posts:
+            self.post_ids.add(post.pk)
+            self.authors.add(post.author_id)
+            self.counted_users.add(post.author_id)
+            if post.group_id is not None:
+                self.group_ids.add(post.group_id)
+        for comment in comments:
+            self.counted_users.add(comment.author_id)
+        for follow in follows:
+            self.authors.add(follow.author_id)
+            self.counted_users.update((follow.user_id, follow.author_id))
+        self.counted_users.discard(None)
+        for buffer in self.buffers.values():
+            buffer.clear()
+
+    def _build(self, entries, build):
+        """[(номер строки, объект)]; строки, которые не собрать, в отчёт."""
+        built = []
+        for number, record in entries:
+            try:
+                built.append((number, build(record)))
+            except (ImportDataError, KeyError, TypeError, ValueError) as error:
+                self._skip(number, f'некорректная строка: {error!r}')
+        return built
+
+    def _resolve_users(self, entries, *keys):
+        self.users.resolve(
+            record.get(key) for _, record in entries for key in keys
+            if record.get(f'{key}_id') is None
+        )
+
+    def _copy_image(self, name):
+        if not name or self.media_source is None:
+            return name or ''
+        storage = Post._meta.get_field('image').storage
+        try:
+            with open(os.path.join(self.media_source, name), 'rb') as image:
+                return storage.save(
+                    f'posts/{os.path.basename(name)}', File(image))
+        except FileNotFoundError:
+            return None
+
+    def _build_posts(self, entries):
+        if not entries:
+            return []
+        self._resolve_users(entries, 'author')
+        self.groups.resolve(
+            record.get('group') for _, record in entries
+            if record.get('group_id') is None
+        )
+        # В image пока имя из файла, картинка копируется после проверки.
+        built = self._build(entries, lambda record: Post(
+            id=int(record['id']),
+            author_id=self.users.id_for(record, 'author'),
+            group_id=self.groups.id_for(record, 'group'),
+            text=record.get('text'),
+            pub_date=_parse_datetime(record.get('pub_date')),
+            image=record.get('image') or '',
+        ))
+        users = _existing(User, (post.author_id for _, post in built))
+        groups = _existing(Group, (post.group_id for _, post in built))
+        present = _existing(Post, (post.pk for _, post in built))
+        seen = set()
+
+        def problem(post):
+            if post.pk in present or post.pk in seen:
+                return EXISTS
+            if not post.text:
+                return f'пост {post.pk}: нет текста'
+            if post.author_id not in users:
+                return f'пост {post.pk}: нет автора {post.author_id}'
+            if post.group_id is not None and post.group_id not in groups:
+                return f'пост {post.pk}: нет группы {post.group_id}'
+            seen.add(post.pk)
+            return None
+
+        posts = self._valid(built, problem)
+        # Картинки копируются параллельно: это в основном ожидание диска.
+        copied = self.executor.map(
+            self._copy_image, [post.image.name for post in posts])
+        for post, image in zip(posts, copied):
+            if image is None:
+                self.missing_images += 1
+                image = ''
+            post.image = image
+        return posts
+
+    def _build_comments(self, entries, new_posts):
+        if not entries:
+            return []
+        self._resolve_users(entries, 'author')
+        built = self._build(entries, lambda record: Comment(
+            id=int(record['id']),
+            post_id=int(record['post_id']),
+            author_id=self.users.id_for(record, 'author'),
+            text=record.get('text'),
+            created=_parse_datetime(record.get('created')),
+        ))
+        users = _existing(User, (comment.author_id for _, comment in built))
+        posts = new_posts | _existing(
+            Post, (comment.post_id for _, comment in built))
+        present = _existing(Comment, (comment.pk for _, comment in built))
+        seen = set()
+
+        def problem(comment):
+            if comment.pk in present or comment.pk in seen:
+                return EXISTS
+            prefix = f'комментарий {comment.pk}'
+            if not comment.text:
+                return f'{prefix}: нет текста'
+            if comment.post_id not in posts:
+                return f'{prefix}: нет поста {comment.post_id}'
+            author_id = comment.author_id
+            if author_id is not None and author_id not in users:
+                return f'{prefix}: нет автора {author_id}'
+            seen.add(comment.pk)
+            return None
+
+        return self._valid(built, problem)
+
+    def _build_follows(self, entries):
+        if not entries:
+            return []
+        self._resolve_users(entries, 'user', 'author')
+
+        def build(record):
+            follow = Follow(
+                user_id=self.users.id_for(record, 'user'),
+                author_id=self.users.id_for(record, 'author'),
+            )
+            if record.get('id') is not None:
+                follow.id = int(record['id'])
+            return follow
+
+        built = self._build(entries, build)
+        users = _existing(User, (
+            user_id for _, follow in built
+            for user_id in (follow.user_id, follow.author_id)))
+        pairs = {(follow.user_id, follow.author_id) for _, follow in built}
+        present = set(
+            Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in pairs},
+                author_id__in={author_id for _, author_id in pairs},
+            ).values_list('user_id', 'author_id')
+        ) if pairs else set()
+        present_ids = _existing(Follow, (follow.pk for _, follow in built))
+        seen = set()
+
+        def problem(follow):
+            pair = (follow.user_id, follow.author_id)
+            if pair in present or pair in seen or follow.pk in present_ids:
+                return EXISTS
+            for user_id in pair:
+                if user_id not in users:
+                    return f'подписка: нет пользователя {user_id}'
+            if follow.user_id == follow.author_id:
+                return f'подписка на себя: {follow.user_id}'
+            seen.add(pair)
+            return None
+
+        return self._valid(built, problem)
+
+    def finalize(self):
+        """Обновляет то, что при bulk_create делали бы сигналы."""
+        for user_ids in batches(sorted(self.counted_users), self.batch_size):
+            stats.recount(User.objects.filter(pk__in=user_ids))
+        search.index_many(self.post_ids, self.batch_size)
+        timeline.backfill_authors(sorted(self.authors))
+        generations.bump(
+            generations.INDEX,
+            *(generations.author(author_id) for author_id in self.authors),
+            *(generations.group(group_id) for group_id in self.group_ids),
+        )
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации подписок по всему графу подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=suggestions.TOP,
+            help='Сколько рекомендаций хранить на пользователя',
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=suggestions.SAMPLE,
+            help='Сколько подписчиков автора смотреть для совместных подписок',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=suggestions.BATCH_SIZE,
+            help='Сколько пользователей записывать за одну транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        graph = suggestions.FollowGraph.load()
+        fanout = suggestions.fanout_stats(graph)
+        self.stdout.write(
+            'Пользователей: {users}, подписок: {follows}. Подписчиков у '
+            'автора: медиана {median}, p99 {p99}, максимум {max}; авторов '
+            'с лентой при чтении: {read_time_authors}'.format(**fanout)
+        )
+        written = suggestions.compute(
+            graph,
+            top=options['top'],
+            sample=options['sample'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендаций: {written}, '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии и подписки в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--types',
+            default='',
+            help='Типы строк через запятую: post, comment, follow',
+        )
+        parser.add_argument(
+            '--since',
+            default='',
+            help='Последние выгруженные id по типам, например '
+                 'post:123,comment:456; выгружаются записи новее них',
+        )
+        parser.add_argument(
+            '--since-date',
+            help='Выгружать только записи не старше даты (ISO 8601)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=export.CHUNK_SIZE,
+            help='Сколько строк читать из базы за раз',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжимать выгрузку в gzip',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для выгрузки, по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            types = export.parse_types(options['types'])
+            since = export.parse_since(options['since'])
+            since_date = options['since_date'] and export.parse_since_date(
+                options['since_date'])
+        except export.ExportError as error:
+            raise CommandError(error)
+
+        chunks = export.lines(
+            types=types,
+            since=since,
+            since_date=since_date,
+            chunk_size=options['chunk_size'],
+        )
+        if options['gzip']:
+            chunks = export.gzipped(chunks)
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                output.writelines(chunks)
+        else:
+            output = getattr(self.stdout, 'buffer', None)
+            if output is None:
+                # stdout без бинарного буфера (например, StringIO в тестах).
+                for chunk in chunks:
+                    self.stdout.write(chunk.decode(), ending='')
+            else:
+                output.writelines(chunks)
+                output.flush()
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from posts import export, importer
+
+
+class Command(BaseCommand):
+    help = 'Импортирует посты, комментарии и подписки из NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл .ndjson или .csv, можно сжатый .gz',
+        )
+        parser.add_argument(
+            '--type',
+            choices=list(export.TYPES),
+            help='Тип строк для файлов без колонки type',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importer.BATCH_SIZE,
+            help='Сколько строк каждого типа писать за одну транзакцию',
+        )
+        parser.add_argument(
+            '--media-source',
+            help='Каталог, из которого копировать картинки постов',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=importer.IMAGE_WORKERS,
+            help='Сколько потоков копируют картинки',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <path>.checkpoint',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать заново, не продолжая с контрольной точки',
+        )
+        parser.add_argument(
+            '--no-finalize',
+            action='store_true',
+            help='Не пересчитывать счётчики, индекс и ленты после импорта',
+        )
+
+    def progress(self, rows, rate):
+        self.stdout.write(f'Обработано строк: {rows} ({rate:.0f} строк/с)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = importer.Checkpoint(
+            options['checkpoint'] or f'{path}.checkpoint', path)
+        if options['restart']:
+            checkpoint.remove()
+        data_importer = importer.Importer(
+            batch_size=options['batch_size'],
+            media_source=options['media_source'],
+            workers=options['workers'],
+            progress=self.progress,
+        )
+        try:
+            rows = data_importer.run(
+                importer.read_rows(path, options['type']), checkpoint)
+        except (OSError, ValueError, KeyError, DatabaseError) as error:
+            raise CommandError(error)
+
+        if not options['no_finalize']:
+            data_importer.finalize()
+        checkpoint.remove()
+        if data_importer.missing_images:
+            self.stderr.write(
+                f'Не найдено картинок: {data_importer.missing_images}')
+        if data_importer.skipped:
+            self.stderr.write(
+                f'Пропущено строк с ошибками: {data_importer.skipped}')
+            for number, reason in data_importer.skipped_rows:
+                self.stderr.write(f'  строка {number}: {reason}')
+        if data_importer.existing:
+            self.stdout.write(
+                f'Уже были в базе: {data_importer.existing}')
+        imported = rows - data_importer.skipped - data_importer.existing
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано строк: {imported}. Миниатюры для новых картинок '
+            f'строит команда pregenerate_thumbnails.'
+        ))
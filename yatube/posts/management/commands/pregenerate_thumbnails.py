@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры картинок постов, которые ещё не готовы, и '
+        'записывает имена миниатюр постам, готовым без них. '
+        'Запускается по расписанию: подбирает задачи, потерянные '
+        'фоновой очередью'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить миниатюры всех постов с картинками',
+        )
+
+    def handle(self, *args, **options):
+        posts = (Post.objects.exclude(image='') if options['all']
+                 else thumbnails.pending())
+        done = failed = last = 0
+        while True:
+            ids = list(
+                posts.filter(pk__gt=last).order_by('pk')
+                .values_list('pk', flat=True)[:settings.THUMBNAIL_SWEEP_BATCH]
+            )
+            if not ids:
+                break
+            for post_id in ids:
+                if thumbnails.build(post_id):
+                    done += 1
+                else:
+                    failed += 1
+            last = ids[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Подготовлено постов: {done}'
+        ))
+        if failed:
+            self.stderr.write(
+                f'Не удалось подготовить: {failed}, подробности в логе')
@@ -0,0 +1,224 @@
+import bisect
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from faker import Faker
+
+from posts import generations, search, stats
+from posts.models import (Comment, Follow, Group, Post, Profile,
+                          TimelineEntry, User)
+
+TEXT_POOL = 1000  # Сколько разных текстов сгенерировать через Faker
+PERIOD = timedelta(days=365)  # За какой период раскидать даты
+
+
+def zipf_sampler(rnd, size, exponent):
+    """Случайный ранг от 0 до size - 1 с вероятностью ~ 1 / rank ** s."""
+    weights = itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1))
+    cumulative = list(weights)
+    total = cumulative[-1]
+    return lambda: bisect.bisect(cumulative, rnd.random() * total)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def insert_many(sql, rows, batch_size):
+    """executemany пачками, каждая пачка в своей транзакции."""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=5_000_000)
+        parser.add_argument(
+            '--follows-per-user',
+            type=int,
+            default=20,
+            help='Сколько авторов читает каждый пользователь',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Показатель закона Ципфа для авторов и комментариев',
+        )
+        parser.add_argument(
+            '--timeline-length',
+            type=int,
+            default=settings.TIMELINE_LENGTH,
+            help='Сколько записей оставить в ленте каждого пользователя; '
+                 '0 — не заполнять ленты',
+        )
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def step(self, message, started):
+        self.stdout.write(f'{message}: {time.monotonic() - started:.1f} с')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        texts = [fake.paragraph(nb_sentences=3) for _ in range(TEXT_POOL)]
+        batch_size = options['batch_size']
+        users, groups = options['users'], options['groups']
+        posts, comments = options['posts'], options['comments']
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        moment = connection.ops.adapt_datetimefield_value
+
+        first_user = next_id(User)
+        first_group = next_id(Group)
+        first_post = next_id(Post)
+
+        started = time.monotonic()
+        insert_many(
+            f'INSERT INTO {User._meta.db_table} (password, is_superuser, '
+            'username, first_name, last_name, email, is_staff, is_active, '
+            "date_joined) VALUES ('!', %s, %s, '', '', '', %s, 1, %s)",
+            ((False, f'bench{first_user + num}', False, moment(start))
+             for num in range(users)),
+            batch_size,
+        )
+        insert_many(
+            f'INSERT INTO {Group._meta.db_table} (title, slug, description) '
+            'VALUES (%s, %s, %s)',
+            ((fake.sentence(nb_words=3), f'bench-{first_group + num}',
+              rnd.choice(texts)) for num in range(groups)),
+            batch_size,
+        )
+        self.step('Пользователи и группы', started)
+
+        # Немногие авторы пишут большую часть постов и собирают большую
+        # часть подписчиков и комментариев, как в живой соцсети.
+        author_rank = zipf_sampler(rnd, users, options['skew'])
+        insert_many(
+            f'INSERT INTO {Post._meta.db_table} (text, pub_date, author_id, '
+            "group_id, image, thumbnails_ready, thumbnails, fanned_out) "
+            "VALUES (%s, %s, %s, %s, '', %s, '', %s)",
+            (
+                (
+                    rnd.choice(texts),
+                    moment(start + PERIOD * num / posts),
+                    first_user + author_rank(),
+                    first_group + rnd.randrange(groups) if num % 3 else None,
+                    True,
+                    True,
+                )
+                for num in range(posts)
+            ),
+            batch_size,
+        )
+        self.step('Посты', started)
+
+        viral = list(range(first_post, first_post + posts))
+        rnd.shuffle(viral)
+        post_rank = zipf_sampler(rnd, posts, options['skew'])
+        insert_many(
+            f'INSERT INTO {Comment._meta.db_table} (post_id, author_id, '
+            'text, created) VALUES (%s, %s, %s, %s)',
+            (
+                (
+                    viral[post_rank()],
+                    first_user + rnd.randrange(users),
+                    rnd.choice(texts)[:200],
+                    moment(start + PERIOD * num / comments),
+                )
+                for num in range(comments)
+            ),
+            batch_size,
+        )
+        self.step('Комментарии', started)
+
+        def follows():
+            count = min(options['follows_per_user'], users - 1)
+            for num in range(users):
+                user_id = first_user + num
+                followed = set()
+                while len(followed) < count:
+                    author_id = first_user + author_rank()
+                    if author_id != user_id:
+                        followed.add(author_id)
+                for author_id in followed:
+                    yield user_id, author_id
+
+        insert_many(
+            f'INSERT INTO {Follow._meta.db_table} (user_id, author_id) '
+            'VALUES (%s, %s)',
+            follows(),
+            batch_size,
+        )
+        self.step('Подписки', started)
+
+        stats.recount(User.objects.filter(pk__gte=first_user))
+        self.mark_unfanned(first_user)
+        self.step('Счётчики', started)
+        if options['timeline_length']:
+            self.fill_timelines(first_user, options['timeline_length'])
+            self.step('Ленты подписок', started)
+        if search.is_available():
+            search.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        generations.bump(generations.INDEX)
+        self.step('Поисковый индекс и статистика', started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {users}, групп {groups}, постов '
+            f'{posts}, комментариев {comments}'
+        ))
+
+    def mark_unfanned(self, first_user):
+        """Посты популярных авторов fan-out не раскладывает по лентам."""
+        popular = Profile.objects.filter(
+            user_id__gte=first_user,
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        )
+        Post.objects.filter(
+            author__in=popular.values('user')).update(fanned_out=False)
+        popular.update(has_unfanned_posts=True)
+
+    def fill_timelines(self, first_user, length):
+        """Ленты подписок одним запросом, как их оставили бы fan-out и trim.
+
+        В ленте остаются length последних разложенных постов подписок,
+        поэтому от каждого автора хватает его length последних постов.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TimelineEntry._meta.db_table} '
+                '(user_id, post_id, pub_date) '
+                'SELECT user_id, id, pub_date FROM ('
+                '  SELECT follow.user_id, post.id, post.pub_date, '
+                '  ROW_NUMBER() OVER ('
+                '    PARTITION BY follow.user_id '
+                '    ORDER BY post.pub_date DESC, post.id DESC'
+                '  ) AS position '
+                f'  FROM {Follow._meta.db_table} AS follow JOIN ('
+                '    SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+                '      PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f'    ) AS position FROM {Post._meta.db_table} '
+                '    WHERE fanned_out'
+                '  ) AS post ON post.author_id = follow.author_id '
+                '  WHERE follow.user_id >= %s AND post.position <= %s'
+                ') WHERE position <= %s',
+                [first_user, length, length],
+            )
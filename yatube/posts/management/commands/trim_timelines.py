@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.timeline import trim_all
+
+
+class Command(BaseCommand):
+    help = 'Обрезает ленты подписок до заданного числа записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--length',
+            type=int,
+            default=settings.TIMELINE_LENGTH,
+            help='Сколько последних записей оставить в каждой ленте',
+        )
+
+    def handle(self, *args, **options):
+        deleted = trim_all(options['length'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей лент: {deleted}'
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_unfanned_posts(apps, schema_editor):
+    # Посты популярных авторов раньше не раскладывались по лентам.
+    Post = apps.get_model('posts', 'Post')
+    Profile = apps.get_model('posts', 'Profile')
+    popular = Profile.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+    Post.objects.filter(
+        author__in=popular.values('user')).update(fanned_out=False)
+    popular.update(has_unfanned_posts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_follow_suggestion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_pub_date_idx',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Разложен по лентам'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='has_unfanned_posts',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Есть посты, не разложенные по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(fanned_out=False), fields=['author', '-pub_date', '-id'], name='post_unfanned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.RunPython(mark_unfanned_posts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,47 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
+# Поля, которые выводит карточка поста в ленте.
+FEED_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'thumbnails_ready',
+    'thumbnails',
+    'author',
+    'author__username',
+    'group',
+    'group__title',
+    'group__slug',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним запросом, число комментариев.
+
+        Счётчик считается коррелированным подзапросом, чтобы он выполнялся
+        только для постов страницы, а не группировал всю таблицу.
+        """
+        comments = (
+            Comment.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return (
+            self.select_related('author', 'group')
+            .only(*FEED_FIELDS)
+            .annotate(comment_count=Coalesce(Subquery(comments), 0))
+        )
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -31,13 +70,57 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True,
+    )
+    thumbnails_ready = models.BooleanField(
+        'Миниатюры готовы',
+        default=False,
+        editable=False,
     )
+    # JSON-список [формат, ширина, имя файла] из posts.thumbnails: шаблоны
+    # строят srcset по нему, не обращаясь к sorl.
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        editable=False,
+    )
+    # Пост популярного автора не раскладывается по лентам подписчиков
+    # (posts.timeline) и читается при выдаче ленты, даже если автор потом
+    # растерял подписчиков.
+    fanned_out = models.BooleanField(
+        'Разложен по лентам',
+        default=True,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+            # Лента подписок дочитывает такие посты по каждому автору.
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_unfanned_idx',
+                condition=models.Q(fanned_out=False),
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -82,6 +165,16 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['-created', '-id'],
+                name='comment_created_id_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -107,3 +200,107 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок, разложенная подписчику при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            )
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """Автор, на которого стоит подписаться, посчитанный заранее.
+
+    Таблицу заполняет команда compute_follow_suggestions (posts.suggestions).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    known_followers = models.PositiveIntegerField(
+        'Подписчиков среди подписок пользователя', default=0)
+    score = models.PositiveIntegerField('Вес', default=0)
+
+    class Meta:
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow_suggestion'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score', 'author'],
+                name='suggestion_user_score_idx'
+            )
+        ]
+
+
+class Profile(models.Model):
+    """Счётчики пользователя, которые иначе считались бы на каждый запрос."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Посты автора с fanned_out=False лента подписок читает при выдаче.
+    has_unfanned_posts = models.BooleanField(
+        'Есть посты, не разложенные по лентам',
+        default=False,
+        editable=False,
+    )
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return str(self.user)
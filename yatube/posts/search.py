@@ -0,0 +1,138 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Текст постов дублируется в виртуальную таблицу FTS5 (rowid = id поста),
+сигналы поддерживают её в актуальном состоянии, а результаты
+сортируются по BM25. На других СУБД поиск падает обратно на icontains.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .utils import batches
+
+TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def to_match(query):
+    """Запрос пользователя как безопасное выражение MATCH.
+
+    Каждое слово ищется по префиксу, все слова должны встретиться.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def index(post):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def remove(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_many(post_ids, chunk_size=1000):
+    """Переиндексирует посты с данными id пачками; возвращает их число.
+
+    Каждая пачка меняется в своей транзакции, остальной индекс не трогается,
+    поэтому поиск работает и во время импорта.
+    """
+    if not is_available():
+        return 0
+    indexed = 0
+    for ids in batches(sorted(post_ids), chunk_size):
+        rows = list(
+            Post.objects.filter(pk__in=ids).values_list('pk', 'text'))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {TABLE} WHERE rowid = %s',
+                [[pk] for pk in ids],
+            )
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', rows
+            )
+        indexed += len(rows)
+    return indexed
+
+
+def rebuild(chunk_size=1000):
+    """Заново заполняет индекс пачками; возвращает число постов."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        indexed = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'text')[:chunk_size]
+            )
+            if not rows:
+                return indexed
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', rows
+            )
+            indexed += len(rows)
+            last_pk = rows[-1][0]
+
+
+def matching(match):
+    """Подзапрос id постов, подходящих под выражение MATCH."""
+    return RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+                  [match])
+
+
+class SearchResults:
+    """Последовательность постов в порядке BM25 для Paginator."""
+
+    def __init__(self, match):
+        self.match = match
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY bm25({TABLE}) LIMIT %s OFFSET %s',
+                [self.match, item.stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search(query):
+    """Посты по запросу: список по релевантности или QuerySet."""
+    match = to_match(query)
+    if not match:
+        return Post.objects.none()
+    if not is_available():
+        return Post.objects.for_feed().filter(text__icontains=query)
+    return SearchResults(match)
@@ -0,0 +1,91 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (follow_graph, generations, search, stats, thumbnails,
+               timeline)
+from .models import Comment, Follow, Group, Post, Profile, User
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, **kwargs):
+    previous = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group_id', 'image').first()
+        if instance.pk else None
+    )
+    instance._previous_group_id, previous_image = previous or (None, '')
+    instance._previous_image = previous_image
+    instance._image_changed = instance.image.name != previous_image
+    if instance._image_changed:
+        instance.thumbnails_ready = False
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+        stats.bump(instance.author_id, posts_count=1)
+    search.index(instance)
+    if getattr(instance, '_image_changed', False):
+        thumbnails.release(instance, instance._previous_image)
+        if instance.image:
+            thumbnails.schedule(instance)
+    generations.bump(*generations.post_scopes(
+        instance, getattr(instance, '_previous_group_id', None)
+    ))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.bump(instance.author_id, posts_count=-1)
+    thumbnails.release(instance, instance.image.name)
+    search.remove(instance.pk)
+    generations.bump(*generations.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, comments_count=1)
+        generations.bump(generations.author(instance.author_id),
+                         *generations.post_scopes(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.bump(instance.author_id, comments_count=-1)
+    generations.bump(generations.author(instance.author_id))
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        generations.bump(*generations.post_scopes(post))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.user_id, following_count=1)
+        stats.bump(instance.author_id, followers_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        generations.bump(*generations.follow_scopes(instance))
+        follow_graph.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+    stats.bump(instance.user_id, following_count=-1)
+    stats.bump(instance.author_id, followers_count=-1)
+    generations.bump(*generations.follow_scopes(instance))
+    follow_graph.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Group)
+def bump_group(sender, instance, created, **kwargs):
+    if not created:
+        generations.bump(generations.group(instance.pk))
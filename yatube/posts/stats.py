@@ -0,0 +1,85 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, Profile, User
+
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _counted_users():
+    """Пользователи с честно посчитанными счётчиками."""
+    annotations = {}
+    for counter, (model, field) in COUNTERS.items():
+        rows = (
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        annotations[counter] = Coalesce(Subquery(rows), 0)
+    return User.objects.annotate(**annotations).order_by('pk')
+
+
+def get_stats(user):
+    """Счётчики пользователя; отсутствующий профиль считается заново."""
+    try:
+        return Profile.objects.get(user=user)
+    except Profile.DoesNotExist:
+        recount(User.objects.filter(pk=user.pk))
+        return Profile.objects.get(user=user)
+
+
+def bump(user_id, **deltas):
+    """Сдвигает счётчики F-выражениями, без гонок между запросами.
+
+    Разошедшийся счётчик не уходит ниже нуля: иначе CHECK столбца
+    PositiveIntegerField уронил бы удаление поста или отписку.
+    """
+    if user_id is None:
+        return
+    updated = Profile.objects.filter(user_id=user_id).update(**{
+        counter: Greatest(F(counter) + delta, 0)
+        for counter, delta in deltas.items()
+    })
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        recount(User.objects.filter(pk=user_id))
+
+
+def recount(users=None, batch_size=1000):
+    """Пересчитывает счётчики и исправляет расхождения пачками.
+
+    Возвращает число исправленных или созданных профилей.
+    """
+    if users is None:
+        users = User.objects.all()
+    users = _counted_users().filter(pk__in=users.values('pk'))
+    fixed = 0
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return fixed
+        last_pk = batch[-1].pk
+        profiles = Profile.objects.in_bulk(
+            [user.pk for user in batch], field_name='user_id'
+        )
+        to_create, to_update = [], []
+        for user in batch:
+            counts = {counter: getattr(user, counter) for counter in COUNTERS}
+            profile = profiles.get(user.pk)
+            if profile is None:
+                to_create.append(Profile(user=user, **counts))
+            elif any(getattr(profile, counter) != value
+                     for counter, value in counts.items()):
+                for counter, value in counts.items():
+                    setattr(profile, counter, value)
+                to_update.append(profile)
+        Profile.objects.bulk_create(to_create, ignore_conflicts=True)
+        Profile.objects.bulk_update(to_update, list(COUNTERS))
+        fixed += len(to_create) + len(to_update)
@@ -0,0 +1,46 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, sizes='(max-width: 960px) 100vw, 960px'):
+    """<picture> с вариантами картинки поста для srcset."""
+    context = {'post': post, 'sizes': sizes}
+    sources = {}
+    for image_format, width, url in thumbnails.urls(post):
+        sources.setdefault(image_format, []).append((width, url))
+    if not sources:
+        return context
+    # Последний формат из POST_IMAGE_FORMATS на момент генерации — запасной.
+    fallback = sources.pop(list(sources)[-1])
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    context.update({
+        'sources': [
+            {
+                'type': MIME_TYPES[image_format],
+                'srcset': _srcset(images),
+            }
+            for image_format, images in sources.items()
+        ],
+        'srcset': _srcset(fallback),
+        'src': min(
+            fallback, key=lambda image: abs(image[0] - ratio_width)
+        )[1],
+        'width': ratio_width,
+        'height': ratio_height,
+    })
+    return context
+
+
+def _srcset(images):
+    return ', '.join(f'{url} {width}w' for width, url in images)
@@ -0,0 +1,35 @@
+from django import template
+
+from posts import follow_graph, suggestions
+from posts.forms import CommentForm
+
+SHOWN_SUGGESTIONS = 5  # Сколько рекомендаций показывать в профиле
+
+register = template.Library()
+
+
+@register.simple_tag
+def is_following(user, author_id):
+    """Подписан ли пользователь на автора."""
+    return follow_graph.is_following(user, author_id)
+
+
+@register.filter
+def followed_by(author_id, user):
+    """{% if post.author_id|followed_by:user %} — без запроса на пост."""
+    return follow_graph.is_following(user, author_id)
+
+
+@register.simple_tag
+def follow_suggestions(user, author_id):
+    """Кого почитать и сколько подписчиков автора вы знаете."""
+    if not user.is_authenticated:
+        return {}
+    known_followers, authors = suggestions.for_profile(
+        user, author_id, SHOWN_SUGGESTIONS)
+    return {'known_followers': known_followers, 'authors': authors}
+
+
+@register.simple_tag
+def comment_form():
+    return CommentForm()
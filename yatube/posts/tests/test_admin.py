@@ -0,0 +1,114 @@
+import datetime
+from unittest import mock
+
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import admin as core_admin
+from core.admin import EstimatedCountPaginator, index_dates
+from core.testing import query_budget
+from posts.models import Comment, Follow, Post, User
+
+DATES = (
+    (2021, 12, 31),
+    (2022, 1, 1),
+    (2022, 1, 15),
+    (2022, 3, 2),
+    (2023, 6, 3),
+)
+
+
+class LargeTableAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.author = User.objects.create_user(username='Author')
+        for year, month, day in DATES:
+            post = Post.objects.create(author=cls.author, text='Текст')
+            moment = timezone.make_aware(
+                datetime.datetime(year, month, day, 23, 30))
+            Post.objects.filter(pk=post.pk).update(pub_date=moment)
+            Comment.objects.create(
+                post=post, author=cls.author, text='Комментарий')
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_index_dates_match_queryset_dates(self):
+        """Даты по индексу совпадают с queryset.dates()"""
+        queryset = Post.objects.all()
+        for kind in ('year', 'month', 'day'):
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    index_dates(queryset, 'pub_date', kind),
+                    list(queryset.dates('pub_date', kind)),
+                )
+
+    def test_changelists(self):
+        """Списки в админке открываются на всех уровнях иерархии дат"""
+        changelist = reverse('admin:posts_post_changelist')
+        urls = (
+            changelist,
+            changelist + '?pub_date__year=2022',
+            changelist + '?pub_date__year=2022&pub_date__month=1',
+            (changelist
+             + '?pub_date__year=2022&pub_date__month=1&pub_date__day=15'),
+            changelist + '?q=Текст',
+            reverse('admin:posts_comment_changelist'),
+            reverse('admin:posts_comment_changelist') + '?created__year=2022',
+            reverse('admin:posts_follow_changelist'),
+            reverse('admin:posts_profile_changelist'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_date_hierarchy_links(self):
+        """Иерархия показывает только периоды, в которых есть посты"""
+        response = self.client.get(
+            reverse('admin:posts_post_changelist') + '?pub_date__year=2022')
+        self.assertContains(response, 'pub_date__month=1')
+        self.assertContains(response, 'pub_date__month=3')
+        self.assertNotContains(response, 'pub_date__month=2&')
+
+    def test_changelist_queries_do_not_grow(self):
+        """Число запросов списка постов не зависит от числа строк
+
+        Иерархия дат делает по поиску на каждый период, поэтому новые
+        посты добавляются в уже существующие годы.
+        """
+        url = reverse('admin:posts_post_changelist')
+        with query_budget(12, duplicates=len(DATES)) as profile:
+            self.client.get(url)
+        for year, month, day in DATES * 5:
+            post = Post.objects.create(author=self.author, text='Ещё')
+            moment = timezone.make_aware(
+                datetime.datetime(year, month, day, 12))
+            Post.objects.filter(pk=post.pk).update(pub_date=moment)
+        with query_budget(12, duplicates=len(DATES)) as grown:
+            self.client.get(url)
+        self.assertEqual(grown.queries, profile.queries)
+
+    def test_paginator_estimates_large_tables(self):
+        """Большая таблица без фильтров не считается COUNT(*)"""
+        queryset = Post.objects.order_by('-pk')
+        last = queryset.first().pk
+        with mock.patch.object(core_admin, 'ESTIMATE_FROM', 1):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, last)
+            filtered = queryset.filter(pk__lte=2)
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 2)
+        self.assertEqual(
+            EstimatedCountPaginator(queryset, 2).count, len(DATES))
+
+    def test_follow_search_by_username(self):
+        """Подписки ищутся по точному логину подписчика или автора"""
+        url = reverse('admin:posts_follow_changelist')
+        for term, found in (('admin', 1), ('Author', 1), ('Auth', 0)):
+            with self.subTest(term=term):
+                response = self.client.get(url, {'q': term})
+                self.assertEqual(
+                    len(response.context['cl'].result_list), found)
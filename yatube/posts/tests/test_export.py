@@ -0,0 +1,97 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import export
+from posts.models import Comment, Follow, Post, User
+
+
+class ExportDataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {num}')
+            for num in range(3)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.user, text='Ок')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def export(self, **options):
+        out = StringIO()
+        call_command('export_data', stdout=out, **options)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_exports_all_types_in_id_order(self):
+        """Выгружаются все типы строк, внутри типа по возрастанию id"""
+        rows = self.export(chunk_size=1)
+        self.assertEqual([row['type'] for row in rows],
+                         ['post'] * 3 + ['comment', 'follow', 'watermark'])
+        self.assertEqual([row['id'] for row in rows[:3]],
+                         [post.pk for post in self.posts])
+        self.assertEqual(rows[0]['text'], 'Пост 0')
+        self.assertEqual(rows[0]['pub_date'],
+                         self.posts[0].pub_date.isoformat())
+        self.assertEqual(rows[-2]['user_id'], self.user.pk)
+
+    def test_resume_from_watermark(self):
+        """Выгрузку можно продолжить с id или с даты"""
+        rows = self.export(types='post', since=f'post:{self.posts[0].pk}')
+        self.assertEqual([row['id'] for row in rows[:-1]],
+                         [post.pk for post in self.posts[1:]])
+        rows = self.export(
+            types='post', since_date=self.posts[2].pub_date.isoformat())
+        self.assertEqual([row['id'] for row in rows[:-1]], [self.posts[2].pk])
+        for options in ({'types': 'likes'}, {'since': 'likes:1'},
+                        {'since': 'post:x'}):
+            with self.subTest(options=options):
+                with self.assertRaises(CommandError):
+                    self.export(**options)
+
+    def test_watermarks_are_per_type(self):
+        """Водяные знаки у каждого типа свои и продолжают выгрузку"""
+        comment = Comment.objects.get()
+        # id комментария меньше id постов: общий since_id потерял бы его.
+        rows = self.export(since=f'post:{self.posts[-1].pk}')
+        self.assertEqual([row['type'] for row in rows],
+                         ['comment', 'follow', 'watermark'])
+        follow = Follow.objects.get()
+        self.assertEqual(
+            rows[-1]['since'],
+            f'post:{self.posts[-1].pk},comment:{comment.pk},'
+            f'follow:{follow.pk}',
+        )
+
+        new_comment = Comment.objects.create(
+            post=self.posts[1], author=self.author, text='Ещё')
+        rows = self.export(since=rows[-1]['since'])
+        self.assertEqual([(row['type'], row.get('id')) for row in rows[:-1]],
+                         [('comment', new_comment.pk)])
+        self.assertIn(f'comment:{new_comment.pk}', rows[-1]['since'])
+
+    def test_gzip_output_file(self):
+        """Выгрузка пишется в файл в gzip"""
+        handle, path = tempfile.mkstemp(suffix='.ndjson.gz')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_data', types='follow', gzip=True, output=path)
+        with gzip.open(path, 'rt', encoding='utf-8') as exported:
+            rows = [json.loads(line) for line in exported]
+        self.assertEqual(rows[:-1], [{
+            'type': 'follow',
+            'id': Follow.objects.get().pk,
+            'user_id': self.user.pk,
+            'author_id': self.author.pk,
+        }])
+
+    def test_gzipped_stream_matches_plain(self):
+        """Сжатый поток распаковывается в те же строки"""
+        plain = b''.join(export.lines())
+        compressed = b''.join(export.gzipped(export.lines(chunk_size=1)))
+        self.assertEqual(gzip.decompress(compressed), plain)
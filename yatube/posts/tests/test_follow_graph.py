@@ -0,0 +1,87 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import follow_graph
+from posts.models import Follow, User
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.authors = [
+            User.objects.create_user(username=f'Author{num}')
+            for num in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+        Follow.objects.create(user=cls.reader, author=cls.authors[2])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def fresh_reader(self):
+        # Новый объект — как request.user в следующем запросе.
+        return User.objects.get(pk=self.reader.pk)
+
+    def test_following_many_in_one_query(self):
+        """Подписки на многих авторов проверяются одним запросом"""
+        reader = self.fresh_reader()
+        with self.assertNumQueries(1):
+            following = follow_graph.following_many(reader, self.authors)
+            self.assertTrue(follow_graph.is_following(
+                reader, self.authors[0]))
+            self.assertFalse(follow_graph.is_following(
+                reader, self.authors[1].pk))
+        self.assertEqual(following, {
+            self.authors[0].pk: True,
+            self.authors[1].pk: False,
+            self.authors[2].pk: True,
+        })
+
+    def test_next_request_reads_cache(self):
+        """Следующий запрос берёт подписки из кэша, без базы"""
+        follow_graph.followees(self.fresh_reader())
+        reader = self.fresh_reader()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follow_graph.followees(reader),
+                {self.authors[0].pk, self.authors[2].pk},
+            )
+
+    def test_follow_and_unfollow_invalidate(self):
+        """Подписка и отписка сбрасывают закэшированные подписки"""
+        author = self.authors[1]
+        follow_graph.followees(self.fresh_reader())
+        self.client.get(
+            reverse('posts:profile_follow', args=(author.username,)))
+        self.assertTrue(
+            follow_graph.is_following(self.fresh_reader(), author))
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(author.username,)))
+        self.assertFalse(
+            follow_graph.is_following(self.fresh_reader(), author))
+
+    def test_anonymous_follows_nobody(self):
+        """Аноним ни на кого не подписан и не ходит в базу"""
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                follow_graph.is_following(AnonymousUser(), self.authors[0]))
+
+    def test_template_filter(self):
+        """Фильтр followed_by проверяет подписку в шаблоне"""
+        template = Template(
+            '{% load user_actions %}'
+            '{% for author in authors %}'
+            '{% if author.pk|followed_by:user %}+{% else %}-{% endif %}'
+            '{% endfor %}'
+        )
+        reader = self.fresh_reader()
+        with self.assertNumQueries(1):
+            rendered = template.render(
+                Context({'authors': self.authors, 'user': reader}))
+        self.assertEqual(rendered, '+-+')
@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts import search
+from posts.models import (Comment, Follow, Group, Post, Profile,
+                          TimelineEntry, User)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+ROWS = [
+    {'type': 'post', 'id': 10, 'author': 'writer', 'group': 'cats',
+     'text': 'Коты спят', 'pub_date': '2020-01-02T03:04:05.123456+00:00'},
+    {'type': 'post', 'id': 11, 'author': 'writer', 'group': None,
+     'text': 'Собаки гуляют', 'pub_date': '2020-01-03T00:00:00+00:00'},
+    {'type': 'comment', 'id': 5, 'post_id': 10, 'author': 'reader',
+     'text': 'Ок', 'created': '2020-01-04T00:00:00+00:00'},
+    {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+]
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportDataTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+
+    def write(self, name, lines):
+        path = os.path.join(self.source, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write('\n'.join(lines) + '\n')
+        return path
+
+    def import_data(self, path, **options):
+        out = StringIO()
+        call_command('import_data', path, stdout=out, stderr=StringIO(),
+                     batch_size=1, **options)
+        return out.getvalue()
+
+    def test_import_ndjson(self):
+        """Импорт сохраняет id и даты и обновляет производные данные"""
+        # Итоговая строка выгрузки с водяными знаками пропускается.
+        watermark = {'type': 'watermark', 'since': 'post:11,comment:5'}
+        path = self.write('data.ndjson', map(json.dumps, ROWS + [watermark]))
+        owner = User.objects.create_user(username='owner')
+        earlier = Post.objects.create(author=owner, text='Собаки спят')
+        with mock.patch('posts.search.rebuild') as rebuild:
+            output = self.import_data(path)
+        rebuild.assert_not_called()
+        self.assertIn('строк/с', output)
+
+        writer = User.objects.get(username='writer')
+        reader = User.objects.get(username='reader')
+        post = Post.objects.get(pk=10)
+        self.assertEqual(post.author, writer)
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        self.assertEqual(post.pub_date.isoformat(), ROWS[0]['pub_date'])
+        self.assertEqual(Comment.objects.get(pk=5).author, reader)
+        self.assertTrue(
+            Follow.objects.filter(user=reader, author=writer).exists())
+
+        self.assertEqual(Profile.objects.get(user=writer).posts_count, 2)
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(), 2)
+        if search.is_available():
+            self.assertEqual(
+                {found.pk for found in search.search('собаки')[:10]},
+                {earlier.pk, 11})
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_invalid_rows_are_skipped_and_reported(self):
+        """Строки с ошибками не пишутся, а попадают в отчёт"""
+        bystander = User.objects.create_user(username='bystander')
+        Profile.objects.filter(user=bystander).update(posts_count=99)
+        rows = ROWS + [
+            {'type': 'post', 'id': 12, 'author_id': 999, 'text': 'Ничей'},
+            {'type': 'post', 'id': 13, 'author': 'writer', 'text': ''},
+            {'type': 'post', 'id': 14, 'author': 'writer', 'text': 'Дата',
+             'pub_date': 'вчера'},
+            {'type': 'comment', 'id': 6, 'post_id': 404, 'author': 'reader',
+             'text': 'Куда?'},
+            {'type': 'follow', 'user': 'writer', 'author': 'writer'},
+        ]
+        path = self.write('data.ndjson', map(json.dumps, rows))
+        out, err = StringIO(), StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_data', path, stdout=out, stderr=err,
+                         batch_size=100)
+
+        self.assertEqual(
+            sorted(Post.objects.values_list('pk', flat=True)), [10, 11])
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        report = err.getvalue()
+        self.assertIn('Пропущено строк с ошибками: 5', report)
+        for reason in ('строка 5: пост 12: нет автора 999',
+                       'строка 6: пост 13: нет текста',
+                       'строка 7: некорректная строка',
+                       'строка 8: комментарий 6: нет поста 404',
+                       'строка 9: подписка на себя'):
+            self.assertIn(reason, report)
+        self.assertIn('Импортировано строк: 4.', out.getvalue())
+        # Дата пишется первой же вставкой, без bulk_update.
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "posts_post"')
+        ])
+        # Счётчики пересчитаны только у затронутых пользователей.
+        self.assertEqual(Profile.objects.get(user=bystander).posts_count, 99)
+
+        # Повторный импорт ничего не пишет и не считает ошибкой.
+        out = StringIO()
+        call_command('import_data', path, stdout=out, stderr=StringIO())
+        self.assertIn('Уже были в базе: 4', out.getvalue())
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_resume_after_crash(self):
+        """После падения импорт продолжается с контрольной точки"""
+        lines = [json.dumps(row) for row in ROWS[:2]]
+        path = self.write('data.ndjson', lines + ['{сломано'])
+        with self.assertRaises(CommandError):
+            self.import_data(path)
+        self.assertEqual(Post.objects.count(), 2)
+        with open(f'{path}.checkpoint', encoding='utf-8') as saved:
+            self.assertEqual(json.load(saved)['rows'], 2)
+
+        # Уже записанные строки пропускаются, даже если файл поменялся.
+        skipped = dict(ROWS[0], id=20)
+        self.write('data.ndjson',
+                   [json.dumps(skipped), lines[1], json.dumps(ROWS[2])])
+        self.import_data(path)
+        self.assertFalse(Post.objects.filter(pk=20).exists())
+        self.assertEqual(Comment.objects.get().post_id, 10)
+
+    def test_import_csv_with_images(self):
+        """CSV-файл с картинками, которые копируются в хранилище"""
+        os.makedirs(os.path.join(self.source, 'old'))
+        with open(os.path.join(self.source, 'old', 'cat.gif'), 'wb') as gif:
+            gif.write(b'GIF89a')
+        path = self.write('posts.csv', [
+            'id,author,group,text,pub_date,image',
+            '1,writer,,С картинкой,2020-01-02T03:04:05,old/cat.gif',
+            '2,writer,,Без картинки,2020-01-02T03:04:06,old/dog.gif',
+        ])
+        self.import_data(path, type='post', media_source=self.source)
+        with_image, without_image = Post.objects.order_by('pk')
+        self.assertTrue(with_image.image.name.startswith('posts/'))
+        self.assertTrue(with_image.image.storage.exists(with_image.image.name))
+        self.assertFalse(with_image.thumbnails_ready)
+        self.assertEqual(without_image.image.name, '')
+
+
+class SeedBenchDataTest(TestCase):
+    def test_seed_small_dataset(self):
+        """seed_bench_data создаёт данные и производные от них записи"""
+        call_command('seed_bench_data', users=20, groups=2, posts=100,
+                     comments=300, follows_per_user=3, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 60)
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertEqual(follow.author.profile.posts_count,
+                         follow.author.posts.count())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=follow.user, post__author=follow.author).exists())
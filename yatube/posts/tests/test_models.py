@@ -1,6 +1,10 @@
-from django.test import TestCase
+from io import StringIO
 
-from posts.models import Group, Post, User
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post, Profile, User
 
 AMOUNT_SYMBOL: int = 15
 
@@ -28,3 +32,54 @@ class PostModelTest(TestCase):
         expected_group_model_str = group_model.title
         self.assertEqual(expected_post_model_str, str(post_model))
         self.assertEqual(expected_group_model_str, str(group_model))
+
+
+class ProfileStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertStats(self, user, **expected):
+        profile = Profile.objects.get(user=user)
+        for counter, value in expected.items():
+            with self.subTest(user=user, counter=counter):
+                self.assertEqual(getattr(profile, counter), value)
+
+    def test_counters_follow_changes(self):
+        """Счётчики профиля меняются вместе с данными"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertStats(self.author, posts_count=1, followers_count=1)
+        self.assertStats(self.reader, comments_count=1, following_count=1)
+
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        post.delete()
+        self.assertStats(self.author, posts_count=0, followers_count=0)
+        self.assertStats(self.reader, comments_count=0, following_count=0)
+
+    def test_drifted_counter_does_not_go_negative(self):
+        """Удаление при обнулённом счётчике не нарушает CHECK столбца"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        Profile.objects.filter(user=self.author).update(posts_count=0)
+        post.delete()
+        self.assertStats(self.author, posts_count=0)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет разошедшиеся счётчики"""
+        Post.objects.create(author=self.author, text='Текст')
+        Profile.objects.update(posts_count=42, followers_count=7)
+        Profile.objects.filter(user=self.reader).delete()
+        call_command('recount_stats', stdout=StringIO())
+        self.assertStats(self.author, posts_count=1, followers_count=0)
+        self.assertStats(self.reader, posts_count=0)
@@ -0,0 +1,133 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import suggestions
+from posts.models import Follow, FollowSuggestion, User
+
+
+class FollowSuggestionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = ('reader', 'anna', 'boris', 'clara', 'dmitry', 'elena',
+                 'xenia')
+        cls.users = {
+            name: User.objects.create_user(username=name) for name in names
+        }
+        for user, author in (
+            ('reader', 'anna'),
+            ('reader', 'boris'),
+            ('anna', 'clara'),
+            ('boris', 'clara'),
+            ('boris', 'dmitry'),
+            ('xenia', 'anna'),
+            ('xenia', 'elena'),
+        ):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author])
+
+    def setUp(self):
+        cache.clear()
+
+    def node(self, graph, name):
+        return list(graph.ids).index(self.users[name].pk)
+
+    def test_graph_matches_follows(self):
+        """CSR-граф повторяет подписки и подписчиков из базы"""
+        graph = suggestions.FollowGraph.load()
+        for name, user in self.users.items():
+            node = self.node(graph, name)
+            with self.subTest(name=name):
+                self.assertEqual(
+                    {graph.ids[i] for i in graph.followees(node)},
+                    set(Follow.objects.filter(user=user)
+                        .values_list('author_id', flat=True)),
+                )
+                self.assertEqual(
+                    {graph.ids[i] for i in graph.followers(node)},
+                    set(Follow.objects.filter(author=user)
+                        .values_list('user_id', flat=True)),
+                )
+
+    def test_suggest_scores(self):
+        """Друзья друзей весомее совместных подписок"""
+        graph = suggestions.FollowGraph.load()
+        result = [
+            (graph.ids[candidate], known, score)
+            for candidate, known, score in suggestions.suggest(
+                graph, self.node(graph, 'reader'))
+        ]
+        self.assertEqual(result, [
+            (self.users['clara'].pk, 2, 2 * suggestions.KNOWN_WEIGHT),
+            (self.users['dmitry'].pk, 1, suggestions.KNOWN_WEIGHT),
+            (self.users['elena'].pk, 0, 1),
+        ])
+
+    def test_fanout_stats(self):
+        """Статистика подписчиков по графу"""
+        stats = suggestions.fanout_stats(suggestions.FollowGraph.load())
+        self.assertEqual(stats['users'], len(self.users))
+        self.assertEqual(stats['follows'], Follow.objects.count())
+        self.assertEqual(stats['max'], 2)
+        self.assertEqual(stats['read_time_authors'], 0)
+
+    def test_command_rewrites_suggestions(self):
+        """Команда переписывает рекомендации, а не добавляет к старым"""
+        out = StringIO()
+        for _ in range(2):
+            call_command('compute_follow_suggestions', batch_size=2,
+                         stdout=out)
+        reader = self.users['reader']
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(user=reader)
+                 .order_by('-score').values_list('author__username',
+                                                 flat=True)),
+            ['clara', 'dmitry', 'elena'],
+        )
+        self.assertFalse(
+            FollowSuggestion.objects.filter(user=self.users['clara'])
+            .exists())
+        self.assertIn('Рекомендаций: ', out.getvalue())
+
+    def test_profile_shows_suggestions(self):
+        """Профиль показывает рекомендации и знакомых подписчиков"""
+        call_command('compute_follow_suggestions', stdout=StringIO())
+        client = Client()
+        client.force_login(self.users['reader'])
+        response = client.get(
+            reverse('posts:profile', args=('clara',)))
+        self.assertContains(response, 'Подписчиков среди ваших подписок: 2')
+        self.assertContains(
+            response, reverse('posts:profile', args=('dmitry',)))
+
+        client.get(reverse('posts:profile_follow', args=('dmitry',)))
+        response = client.get(
+            reverse('posts:profile', args=('clara',)))
+        self.assertNotContains(
+            response, reverse('posts:profile', args=('dmitry',)))
+        self.assertContains(
+            response, reverse('posts:profile', args=('elena',)))
+
+    def test_known_followers_of_followed_author(self):
+        """Знакомые подписчики видны и у автора, на которого подписаны"""
+        call_command('compute_follow_suggestions', stdout=StringIO())
+        reader = self.users['reader']
+        Follow.objects.create(user=reader, author=self.users['clara'])
+        client = Client()
+        client.force_login(reader)
+        response = client.get(reverse('posts:profile', args=('clara',)))
+        self.assertContains(response, 'Подписчиков среди ваших подписок: 2')
+
+    def test_known_followers_outside_top(self):
+        """Знакомые подписчики считаются и для автора вне top рекомендаций"""
+        call_command('compute_follow_suggestions', top=1, stdout=StringIO())
+        reader = self.users['reader']
+        self.assertFalse(FollowSuggestion.objects.filter(
+            user=reader, author=self.users['dmitry']).exists())
+        self.assertEqual(
+            suggestions.known_followers(reader, self.users['dmitry'].pk), 1)
+        self.assertEqual(
+            suggestions.known_followers(reader, self.users['elena'].pk), 0)
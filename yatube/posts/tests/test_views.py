@@ -1,16 +1,36 @@
+import base64
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post, User
+from core.testing import query_budget, run_on_commit
+from posts import generations, thumbnails, timeline
+from posts import urls as posts_urls
+from posts.models import (Comment, Follow, Group, Post, Profile,
+                          TimelineEntry, User)
+from posts.utils import (NUMBER_OF_COMMENTS, NUMBER_OF_POSTS,
+                         CursorPaginator)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+OVERFLOW_PKS = ('100000000000000000000', '1e400', '-9223372036854775809')
+
+
+def overflow_cursor(pk):
+    """Курсор с pk, который не помещается в целочисленный столбец."""
+    payload = f'["o", "2023-01-01T00:00:00+00:00", {pk}]'
+    return base64.urlsafe_b64encode(payload.encode()).decode()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -150,10 +170,53 @@ class PostPagesTests(TestCase):
         cache.clear()
         response = self.client.get(reverse('posts:index'))
         self.assertIn(cache_post, response.context['page_obj'])
-        cache_post.delete()
+        Post.objects.filter(pk=cache_post.pk).update(text='Без сигналов')
         new_response = self.client.get(reverse('posts:index'))
         self.assertEqual(response.content, new_response.content)
 
+    def test_cache_invalidated_on_post_changes(self):
+        """Изменение поста сразу сбрасывает кэш его лент"""
+        cache_post = Post.objects.create(
+            author=self.user,
+            group=self.group,
+            text='Важный текст'
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.client.get(url)
+        cache_post.text = 'Исправленный текст'
+        with run_on_commit():
+            cache_post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Исправленный')
+        with run_on_commit():
+            cache_post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Исправленный')
+
+    def test_cache_invalidated_for_previous_group(self):
+        """Перенос поста в другую группу сбрасывает кэш старой группы"""
+        other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Описание',
+        )
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.assertContains(self.client.get(url), self.post.text)
+        self.post.group = other_group
+        with run_on_commit():
+            self.post.save()
+        self.assertNotContains(self.client.get(url), self.post.text)
+        self.post.group = self.group
+        with run_on_commit():
+            self.post.save()
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -203,6 +266,68 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     len(response.context['page_obj']), self.SECOND_PAGE)
 
+    def test_cursor_pages_walk_all_posts(self):
+        """Проверка: курсоры обходят ленту целиком"""
+        expected = list(Post.objects.order_by('-pub_date', '-pk')
+                        .values_list('pk', flat=True))
+        for reverse_name in self.templates_pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                seen = []
+                url = reverse_name
+                while url:
+                    page_obj = self.guest_client.get(url).context['page_obj']
+                    seen.extend(post.pk for post in page_obj)
+                    url = (page_obj.next_cursor
+                           and f'{reverse_name}?cursor={page_obj.next_cursor}')
+                self.assertEqual(seen, expected)
+
+    def test_cursor_paginator_skips_count_and_offset(self):
+        """Проверка: курсорный пагинатор не делает COUNT и OFFSET"""
+        cursor_paginator = CursorPaginator(Post.objects.all(), 5)
+        cursor = None
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                cursor = cursor_paginator.get_page(cursor).next_cursor
+        self.assertIsNone(cursor)
+        self.assertEqual(len(queries), 3)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_cursor_previous_page(self):
+        """Проверка: курсор «новее» возвращает предыдущую страницу"""
+        url = reverse('posts:index')
+        first_page = self.guest_client.get(url).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        second_page = self.guest_client.get(
+            f'{url}?cursor={first_page.next_cursor}').context['page_obj']
+        self.assertEqual(len(second_page), self.SECOND_PAGE)
+        self.assertIsNone(second_page.next_cursor)
+        back_page = self.guest_client.get(
+            f'{url}?cursor={second_page.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Проверка: испорченный курсор открывает первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), self.FIRST_PAGE)
+
+    def test_out_of_range_cursor_shows_first_page(self):
+        """Проверка: курсор с огромным pk не роняет страницу"""
+        post = Post.objects.latest('pk')
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:post_comments', kwargs={'post_id': post.pk}),
+        )
+        for url in urls:
+            for pk in OVERFLOW_PKS:
+                with self.subTest(url=url, pk=pk):
+                    response = self.guest_client.get(
+                        url, {'cursor': overflow_cursor(pk)})
+                    self.assertEqual(response.status_code, 200)
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -216,6 +341,7 @@ class FollowTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client_author = Client()
         self.authorized_client_following = Client()
@@ -264,3 +390,659 @@ class FollowTest(TestCase):
         response = self.authorized_client_following.get(
             reverse('posts:follow_index'))
         self.assertNotContains(response, post_follow)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Проверка: новый пост попадает в ленту подписчика"""
+        Follow.objects.create(user=self.author, author=self.user_following)
+        post = Post.objects.create(author=self.user_following, text='Новый')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.author, post=post).exists()
+        )
+        response = self.authorized_client_author.get(
+            reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes_timeline(self):
+        """Проверка: подписка заполняет ленту, отписка очищает её"""
+        self.authorized_client_author.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user_following.username}
+        ))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.author, post=self.post).exists())
+        self.authorized_client_author.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.user_following.username}
+        ))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.author).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_request(self):
+        """Проверка: посты популярного автора читаются без раскладки"""
+        Follow.objects.create(user=self.author, author=self.user_following)
+        post = Post.objects.create(author=self.user_following, text='Новый')
+        self.assertFalse(post.fanned_out)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client_author.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post, self.post])
+
+
+class TimelineFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.authors = [
+            User.objects.create_user(username=f'Writer{num}')
+            for num in range(2)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def pages(self, cursor=None):
+        """Все страницы ленты подписок от курсора в сторону «старее»."""
+        pages = []
+        while True:
+            url = reverse('posts:follow_index')
+            if cursor:
+                url += f'?cursor={cursor}'
+            page = self.client.get(url).context['page_obj']
+            pages.append(page)
+            cursor = page.next_cursor
+            if cursor is None:
+                return pages
+
+    def write(self, count):
+        return [
+            Post.objects.create(
+                author=self.authors[num % 2], text=f'Пост {num}')
+            for num in range(count)
+        ]
+
+    def test_page_numbers_still_work(self):
+        """Старые ссылки ?page= листают ленту подписок по номеру"""
+        posts = self.write(NUMBER_OF_POSTS + 2)
+        url = reverse('posts:follow_index')
+        first = self.client.get(url, {'page': 1}).context['page_obj']
+        second = self.client.get(url, {'page': 2}).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in first] + [post.pk for post in second],
+            [post.pk for post in reversed(posts)])
+
+    def test_unfanned_posts_stay_after_author_drops_below_limit(self):
+        """Посты периода популярности остаются в ленте и после него"""
+        author = self.authors[0]
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            popular_post = Post.objects.create(author=author, text='Старый')
+        fresh_post = Post.objects.create(author=author, text='Свежий')
+        self.assertTrue(
+            Profile.objects.get(user=author).has_unfanned_posts)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=fresh_post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            post=popular_post).exists())
+        [page] = self.pages()
+        self.assertEqual(list(page), [fresh_post, popular_post])
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_trimmed_timeline_pages_into_history(self):
+        """Обрезанная лента листается вглубь по постам подписок"""
+        posts = self.write(NUMBER_OF_POSTS * 2 + 5)
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            posts.append(self.write(1)[0])
+        out = StringIO()
+        call_command('trim_timelines', stdout=out)
+        self.assertIn('Удалено записей лент: ', out.getvalue())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3)
+
+        pages = self.pages()
+        self.assertEqual(
+            [post for page in pages for post in page], posts[::-1])
+        back = self.client.get(
+            reverse('posts:follow_index')
+            + f'?cursor={pages[-1].previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back), list(pages[-2]))
+
+    def test_follow_trims_deeper_than_backfill(self):
+        """Подписка не оставляет в ленте дыр глубже догрузки автора"""
+        reader = User.objects.create_user(username='Late')
+        posts = self.write(6)
+        with override_settings(TIMELINE_BACKFILL=2):
+            Follow.objects.create(user=reader, author=self.authors[0])
+            Follow.objects.create(user=reader, author=self.authors[1])
+        # Второй автор догружен до posts[3], всё старше удалено.
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=reader)
+                .values_list('post_id', flat=True)),
+            {post.pk for post in posts[3:]},
+        )
+        self.client.force_login(reader)
+        pages = self.pages()
+        self.assertEqual(
+            [post for page in pages for post in page],
+            list(Post.objects.order_by('-pub_date', '-pk')),
+        )
+
+    def test_backfill_authors_in_constant_queries(self):
+        """Догрузка лент после импорта не делает запросов на подписчика"""
+        author = self.authors[0]
+        posts = [post for post in self.write(4) if post.author == author]
+
+        def add_followers(prefix, count):
+            users = [
+                User.objects.create_user(username=f'{prefix}{num}')
+                for num in range(count)
+            ]
+            # bulk_create не вызывает сигналы — как импорт.
+            Follow.objects.bulk_create(
+                Follow(user=user, author=author) for user in users)
+            return users
+
+        add_followers('Few', 2)
+        with CaptureQueriesContext(connection) as few:
+            timeline.backfill_authors([author.pk])
+        users = add_followers('Many', 10)
+        with CaptureQueriesContext(connection) as many:
+            timeline.backfill_authors([author.pk])
+        self.assertEqual(len(many), len(few))
+        for user in users:
+            self.assertEqual(
+                set(TimelineEntry.objects.filter(user=user)
+                    .values_list('post_id', flat=True)),
+                {post.pk for post in posts},
+            )
+
+    def test_timeline_read_through_index(self):
+        """Записи ленты читаются по индексу, без сортировки"""
+        self.write(3)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:follow_index'))
+        [sql] = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_timelineentry"' in query['sql']
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('timeline_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов каждой страницы не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.group = Group.objects.create(
+            title='Просто группа',
+            slug='slug_test',
+            description='Важное описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for num in range(NUMBER_OF_POSTS * 3):
+            author = User.objects.create_user(username=f'Writer{num}')
+            group = Group.objects.create(
+                title=f'Группа {num}',
+                slug=f'group_{num}',
+                description='Описание',
+            )
+            post = Post.objects.create(
+                author=cls.author if num % 2 else author,
+                group=cls.group if num % 2 else group,
+                text=f'Просто пост номер: {num}',
+            )
+            Comment.objects.create(post=post, author=author, text='Ок')
+            Comment.objects.create(post=post, author=cls.user, text='Да')
+        cls.post = cls.author.posts.latest('pk')
+
+        # Бюджет на каждый маршрут posts.urls: (метод, url, запросов).
+        # Читатель выполняет все запросы, кроме правки чужого поста.
+        post_kwargs = {'post_id': cls.post.pk}
+        cls.budgets = {
+            'index': ('get', reverse('posts:index'), 3),
+            'group_list': ('get', reverse(
+                'posts:group_list', kwargs={'slug': cls.group.slug}), 4),
+            'profile': ('get', reverse(
+                'posts:profile', kwargs={'username': cls.author}), 8),
+            'post_detail': ('get', reverse(
+                'posts:post_detail', kwargs=post_kwargs), 5),
+            'post_comments': ('get', reverse(
+                'posts:post_comments', kwargs=post_kwargs), 2),
+            'search': ('get', reverse('posts:search') + '?q=пост', 5),
+            'post_create': ('get', reverse('posts:post_create'), 5),
+            'post_edit': ('get', reverse(
+                'posts:post_edit', kwargs=post_kwargs), 4),
+            'add_comment': ('post', reverse(
+                'posts:add_comment', kwargs=post_kwargs), 7),
+            'follow_index': ('get', reverse('posts:follow_index'), 5),
+            'profile_follow': ('get', reverse(
+                'posts:profile_follow', kwargs={'username': 'Writer0'}), 14),
+            'profile_unfollow': ('get', reverse(
+                'posts:profile_unfollow', kwargs={'username': cls.author}),
+                10),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_every_url_has_budget(self):
+        """Бюджет объявлен для каждого маршрута posts.urls"""
+        names = {pattern.name for pattern in posts_urls.urlpatterns}
+        self.assertEqual(set(self.budgets), names)
+
+    def test_query_budget(self):
+        """Страницы укладываются в бюджет запросов без повторов"""
+        for name, (method, url, budget) in self.budgets.items():
+            client = (self.author_client if name == 'post_edit'
+                      else self.authorized_client)
+            with self.subTest(name=name):
+                with query_budget(budget):
+                    response = getattr(client, method)(
+                        url, {'text': 'Комментарий'} if method == 'post'
+                        else None)
+                self.assertLess(response.status_code, 400)
+
+    def test_feed_counts_comments(self):
+        """Карточка поста получает число комментариев"""
+        response = self.authorized_client.get(reverse('posts:index'))
+        for post in response.context['page_obj']:
+            self.assertEqual(post.comment_count, 2)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Utest')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.uploaded = SimpleUploadedFile(
+            name='small.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B'
+            ),
+            content_type='image/gif'
+        )
+
+    def test_placeholder_until_thumbnails_ready(self):
+        """Пока миниатюры не готовы, лента показывает заглушку"""
+        with mock.patch('posts.thumbnails.enqueue') as enqueue, \
+                run_on_commit():
+            post = Post.objects.create(
+                author=self.user, text='Текст', image=self.uploaded)
+        enqueue.assert_called_once_with(post.pk)
+        self.assertFalse(post.thumbnails_ready)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Изображение обрабатывается')
+
+        with run_on_commit():
+            thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, '<img class="card-img')
+
+    def test_picture_lists_all_variants(self):
+        """Картинка поста отдаётся вариантами WebP и JPEG через srcset"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=self.uploaded)
+        thumbnails.generate(post.pk)
+        # URL вариантов сохранены при генерации, sorl при показе не нужен.
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        get_thumbnail.assert_not_called()
+        self.assertContains(response, '<source type="image/webp"')
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f'.webp {width}w')
+                self.assertContains(response, f'.jpg {width}w')
+
+    @override_settings(THUMBNAIL_WORKERS=0, THUMBNAIL_ATTEMPTS=3)
+    def test_failed_job_is_retried(self):
+        """Упавшая задача повторяется, пока не кончатся попытки"""
+        with mock.patch('posts.thumbnails.generate',
+                        side_effect=[OSError, None]) as generate:
+            thumbnails.enqueue(1)
+        self.assertEqual(generate.call_count, 2)
+        with mock.patch('posts.thumbnails.generate',
+                        side_effect=OSError) as generate:
+            thumbnails.enqueue(1)
+        self.assertEqual(generate.call_count, 3)
+
+    @override_settings(THUMBNAIL_WORKERS=2, THUMBNAIL_RETRY_DELAY=10)
+    def test_background_retry_waits_outside_pool(self):
+        """Фоновый повтор ставится в очередь таймером с растущей паузой"""
+        with mock.patch('posts.thumbnails.generate', side_effect=OSError), \
+                mock.patch('posts.thumbnails.threading.Timer') as timer:
+            thumbnails._run(1, attempt=2)
+        timer.assert_called_once_with(20, thumbnails.enqueue, (1, 3))
+        timer.return_value.start.assert_called_once_with()
+
+    @override_settings(THUMBNAIL_SWEEP_BATCH=1)
+    def test_command_builds_pending_thumbnails(self):
+        """Посты, потерянные очередью, подбирает pregenerate_thumbnails"""
+        with mock.patch('posts.thumbnails.enqueue'), run_on_commit():
+            Post.objects.create(
+                author=self.user, text='Первый', image=self.uploaded)
+            self.uploaded.seek(0)
+            Post.objects.create(
+                author=self.user, text='Второй', image=self.uploaded)
+        out = StringIO()
+        with run_on_commit():
+            call_command('pregenerate_thumbnails', stdout=out)
+        self.assertIn('Подготовлено постов: 2', out.getvalue())
+        self.assertFalse(thumbnails.pending().exists())
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_executor_is_recreated_after_fork(self):
+        """После fork процесс заводит свой пул потоков"""
+        with mock.patch('posts.thumbnails.ThreadPoolExecutor') as executor, \
+                mock.patch.object(thumbnails, '_executor', None):
+            parent = thumbnails._get_executor()
+            self.assertIs(thumbnails._get_executor(), parent)
+            with mock.patch('posts.thumbnails.os.getpid', return_value=-1):
+                thumbnails._get_executor()
+        self.assertEqual(executor.call_count, 2)
+
+    def test_ready_post_without_names_falls_back_to_sorl(self):
+        """Готовый пост без имён миниатюр показывается, имена дописывает
+        команда, не сбрасывая кэш лент"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=self.uploaded)
+        thumbnails.generate(post.pk)
+        Post.objects.filter(pk=post.pk).update(thumbnails='')
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, '.webp 320w')
+
+        with mock.patch('posts.generations.bump') as bump:
+            call_command('pregenerate_thumbnails', stdout=StringIO())
+        bump.assert_not_called()
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        self.assertIn('.webp', post.thumbnails)
+
+    def test_edit_without_new_image_keeps_thumbnails(self):
+        """Правка текста не перестраивает миниатюры"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=self.uploaded)
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        with mock.patch('posts.thumbnails.enqueue') as enqueue, \
+                run_on_commit():
+            post.text = 'Новый текст'
+            post.save()
+        enqueue.assert_not_called()
+        self.assertTrue(post.thumbnails_ready)
+
+    def test_shared_image_deleted_with_last_post(self):
+        """Общая картинка удаляется вместе с последним ссылающимся постом"""
+        first = Post.objects.create(
+            author=self.user, text='Первый', image=self.uploaded)
+        self.uploaded.seek(0)
+        second = Post.objects.create(
+            author=self.user, text='Второй', image=self.uploaded)
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        with run_on_commit():
+            first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        with run_on_commit():
+            second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_image_reused_before_commit_is_kept(self):
+        """Картинку не удаляет коммит, если её успели загрузить снова"""
+        post = Post.objects.create(
+            author=self.user, text='Первый', image=self.uploaded)
+        name = post.image.name
+        storage = post.image.storage
+        with run_on_commit():
+            post.delete()
+            Post.objects.create(author=self.user, text='Второй', image=name)
+        self.assertTrue(storage.exists(name))
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Utest')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Коты спят. Коты едят. Коты играют.')
+        cls.dogs = Post.objects.create(
+            author=cls.user, text='Собаки и один кот гуляют во дворе.')
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_ranks_by_relevance(self):
+        """Поиск находит посты по словам и сортирует по BM25"""
+        self.assertEqual(self.search('кот'), [self.cats.pk, self.dogs.pk])
+        self.assertEqual(self.search('собаки'), [self.dogs.pk])
+        self.assertEqual(self.search('"; DROP'), [])
+        self.assertEqual(self.search(''), [])
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при правке и удалении поста"""
+        post = Post.objects.get(pk=self.dogs.pk)
+        post.text = 'Попугаи'
+        post.save()
+        self.assertEqual(self.search('собаки'), [])
+        self.assertEqual(self.search('попугаи'), [self.dogs.pk])
+        post.delete()
+        self.assertEqual(self.search('попугаи'), [])
+
+    def test_rebuild_search_index(self):
+        """Команда rebuild_search_index заполняет индекс заново"""
+        Post.objects.filter(pk=self.cats.pk).update(text='Хомяки')
+        call_command('rebuild_search_index', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.search('хомяки'), [self.cats.pk])
+        self.assertEqual(self.search('спят'), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс"""
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'})
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.dogs.pk])
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Utest')
+        cls.post = Post.objects.create(author=cls.user, text='Вирусный пост')
+        for num in range(NUMBER_OF_COMMENTS + 5):
+            author = User.objects.create_user(username=f'Commenter{num}')
+            Comment.objects.create(
+                post=cls.post, author=author, text=f'Комментарий {num}')
+
+    def get_detail(self):
+        return self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста только первая порция комментариев"""
+        response = self.get_detail()
+        comments = response.context['post_comment']
+        self.assertEqual(len(comments), NUMBER_OF_COMMENTS)
+        self.assertEqual(comments[0].text,
+                         f'Комментарий {NUMBER_OF_COMMENTS + 4}')
+        self.assertIsNotNone(comments.next_cursor)
+
+    def test_post_detail_query_count_is_bounded(self):
+        """Число запросов не растёт с числом комментариев"""
+        with CaptureQueriesContext(connection) as before:
+            self.get_detail()
+        for num in range(5):
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f'Ещё {num}')
+        with self.assertNumQueries(len(before)):
+            self.get_detail()
+
+    def test_comments_fragment_returns_next_page(self):
+        """Фрагмент отдаёт следующую порцию комментариев"""
+        cursor = self.get_detail().context['post_comment'].next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        comments = response.context['post_comment']
+        self.assertEqual([comment.text for comment in comments],
+                         [f'Комментарий {num}' for num in range(4, -1, -1)])
+        self.assertIsNone(comments.next_cursor)
+        self.assertNotContains(response, 'data-more-comments')
+
+
+class GenerationCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Author')
+
+    def test_generation_changes_after_commit(self):
+        """Поколение ленты сдвигается только после коммита"""
+        before = generations.get(generations.INDEX)
+        with transaction.atomic():
+            Post.objects.create(author=self.user, text='Текст')
+            self.assertEqual(generations.get(generations.INDEX), before)
+        self.assertNotEqual(generations.get(generations.INDEX), before)
+
+    def test_rollback_keeps_generation(self):
+        """Откаченное изменение не сдвигает поколение"""
+        before = generations.get(generations.INDEX)
+        try:
+            with transaction.atomic():
+                Post.objects.create(author=self.user, text='Текст')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(generations.get(generations.INDEX), before)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=60)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Writer')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.other = User.objects.create_user(username='Other')
+        cls.post = Post.objects.create(author=cls.author, text='Первый пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': self.author.username})
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def test_anonymous_hit_skips_views_and_templates(self):
+        """Повторная страница анониму отдаётся без SQL и шаблонов"""
+        first = self.client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(second, 'includes/user_menu.html')
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, 'Первый пост')
+
+    def test_authenticated_reuses_page_with_own_blocks(self):
+        """Пользователь получает кэшированную страницу со своим меню"""
+        self.client.get(reverse('posts:index'))
+        response = self.client_for(self.reader).get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertTemplateUsed(response, 'includes/user_menu.html')
+        self.assertContains(response, 'Пользователь: Reader')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(response, 'Регистрация')
+        self.assertNotContains(response, '<!--personal:')
+
+    def test_follow_button_per_user(self):
+        """Кнопка подписки своя у каждого читателя одной страницы"""
+        self.client.get(self.profile_url)
+        follower = self.client_for(self.reader).get(self.profile_url)
+        other = self.client_for(self.other).get(self.profile_url)
+        author = self.client_for(self.author).get(self.profile_url)
+        self.assertContains(follower, 'Отписаться')
+        self.assertContains(other, 'Подписаться')
+        self.assertNotContains(author, 'Подписаться')
+        self.assertNotContains(author, 'Отписаться')
+        self.assertNotContains(self.client.get(self.profile_url),
+                               'Подписаться')
+
+    def test_post_detail_personal_blocks(self):
+        """Правка — только автору, форма комментария — с CSRF читателя"""
+        self.client.get(self.detail_url)
+        edit_url = reverse('posts:post_edit', kwargs={'post_id': self.post.pk})
+        author = self.client_for(self.author).get(self.detail_url)
+        self.assertContains(author, edit_url)
+        reader = self.client_for(self.reader).get(self.detail_url)
+        self.assertNotContains(reader, edit_url)
+        self.assertContains(reader, 'csrfmiddlewaretoken')
+        self.assertIn('csrftoken', reader.cookies)
+        self.assertNotContains(self.client.get(self.detail_url),
+                               'csrfmiddlewaretoken')
+
+    def test_invalidated_by_posts_comments_and_follows(self):
+        """Пост, комментарий и подписка меняют версию страниц"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(self.profile_url)
+        self.client.get(self.detail_url)
+
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Свежий пост')
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Свежий комментарий')
+            Follow.objects.create(user=self.other, author=self.author)
+
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            'Свежий пост')
+        self.assertContains(self.client.get(self.detail_url),
+                            'Свежий комментарий')
+        self.assertContains(self.client.get(self.profile_url),
+                            'Подписчиков: 2')
+
+    def test_missing_object_is_not_cached(self):
+        """404 проходит мимо кэша страниц"""
+        url = reverse('posts:profile', kwargs={'username': 'nobody'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        User.objects.create_user(username='nobody')
+        self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,188 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Все варианты картинки (ширины POST_IMAGE_WIDTHS в форматах
+POST_IMAGE_FORMATS) строятся в пуле потоков после коммита поста. До
+готовности шаблоны показывают заглушку, поэтому запросы лент никогда не
+ресайзят картинки сами.
+
+Очередь живёт в памяти процесса: упавшая задача повторяется
+THUMBNAIL_ATTEMPTS раз с растущей паузой, а задачи, потерянные при
+рестарте или исчерпавшие попытки, подбирает команда pregenerate_thumbnails,
+запускаемая по расписанию.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from sorl.thumbnail import delete, get_thumbnail
+from sorl.thumbnail.default import storage
+
+from core import metrics
+
+from . import generations
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+
+
+def variants():
+    """Пары (формат, ширина, геометрия, опции sorl) для всех вариантов."""
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    for image_format in settings.POST_IMAGE_FORMATS:
+        for width in settings.POST_IMAGE_WIDTHS:
+            height = round(width * ratio_height / ratio_width)
+            yield image_format, width, f'{width}x{height}', {
+                'crop': 'center',
+                'upscale': True,
+                'format': image_format,
+                'quality': settings.POST_IMAGE_QUALITY,
+            }
+
+
+def urls(post):
+    """[(формат, ширина, URL)] готовых миниатюр поста в порядке variants().
+
+    Имена файлов сохраняет generate(), поэтому здесь нет ни ресайза, ни
+    запросов к хранилищу ключей sorl. Только у постов, готовых до появления
+    поля thumbnails, URL берутся у sorl, пока имена не дозаполнит
+    pregenerate_thumbnails.
+    """
+    if not (post.image and post.thumbnails_ready):
+        return []
+    if not post.thumbnails:
+        return [
+            (image_format, width,
+             get_thumbnail(post.image, geometry, **options).url)
+            for image_format, width, geometry, options in variants()
+        ]
+    return [
+        (image_format, width, storage.url(name))
+        for image_format, width, name in json.loads(post.thumbnails)
+    ]
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    # Потоки пула не переживают fork (gunicorn --preload): потомок
+    # заводит свой пул, иначе задачи в очереди никто не выполнит.
+    if _executor is None or _executor_pid != os.getpid():
+        _executor_pid = os.getpid()
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate(post_id):
+    """Строит миниатюры поста и отмечает их готовность."""
+    post = (
+        Post.objects.filter(pk=post_id)
+        .only('image', 'thumbnails_ready', 'thumbnails', 'author', 'group')
+        .first()
+    )
+    if post is None or not post.image:
+        return
+    names = json.dumps([
+        [image_format, width,
+         get_thumbnail(post.image, geometry, **options).name]
+        for image_format, width, geometry, options in variants()
+    ])
+    # Картинку могли заменить, пока строились миниатюры старой.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails_ready=True, thumbnails=names
+    )
+    # Дозаполнение имён у готового поста разметку не меняет.
+    if updated and not (post.thumbnails_ready
+                        and post.thumbnails in ('', names)):
+        generations.bump(*generations.post_scopes(post))
+
+
+def build(post_id):
+    """Одна попытка построить миниатюры поста, True при успехе."""
+    close_old_connections()
+    started = time.perf_counter()
+    result = 'ok'
+    try:
+        generate(post_id)
+    except Exception:
+        result = 'error'
+        logger.exception('Не удалось подготовить миниатюры поста %s', post_id)
+    finally:
+        close_old_connections()
+        metrics.inc('yatube_thumbnail_generations_total', result=result)
+        metrics.observe('yatube_thumbnail_duration_seconds',
+                        time.perf_counter() - started)
+        metrics.registry.flush()
+    return result == 'ok'
+
+
+def _run(post_id, attempt=1):
+    if build(post_id):
+        return
+    if attempt >= settings.THUMBNAIL_ATTEMPTS:
+        logger.error(
+            'Миниатюры поста %s не готовы после %s попыток, '
+            'их подберёт pregenerate_thumbnails', post_id, attempt)
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        _run(post_id, attempt + 1)
+        return
+    # Пауза не занимает поток пула: повтор ставится в очередь таймером.
+    delay = settings.THUMBNAIL_RETRY_DELAY * 2 ** (attempt - 1)
+    timer = threading.Timer(delay, enqueue, (post_id, attempt + 1))
+    timer.daemon = True
+    timer.start()
+
+
+def enqueue(post_id, attempt=1):
+    if settings.THUMBNAIL_WORKERS:
+        _get_executor().submit(_run, post_id, attempt)
+    else:
+        _run(post_id, attempt)
+
+
+def pending():
+    """Посты с картинкой, миниатюры которых не готовы или без имён."""
+    return Post.objects.exclude(image='').filter(
+        Q(thumbnails_ready=False) | Q(thumbnails=''))
+
+
+def release(post, name):
+    """Удаляет картинку и её миниатюры, если на неё больше нет ссылок.
+
+    Одинаковые загрузки делят один файл (core.storage), поэтому число
+    постов с этим именем картинки и есть счётчик ссылок.
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return
+    field_file = Post._meta.get_field('image').attr_class(
+        post, Post._meta.get_field('image'), name
+    )
+    transaction.on_commit(lambda: _delete(field_file))
+
+
+def _delete(field_file):
+    # Пока транзакция коммитилась, такую же картинку могли загрузить
+    # снова: хранилище вернуло имя существующего файла.
+    if Post.objects.filter(image=field_file.name).exists():
+        return
+    try:
+        delete(field_file)
+    except Exception:
+        logger.exception('Не удалось удалить картинку %s', field_file.name)
+
+
+def schedule(post):
+    """Ставит подготовку миниатюр в очередь после коммита транзакции."""
+    post_id = post.pk
+    transaction.on_commit(lambda: enqueue(post_id))
@@ -0,0 +1,242 @@
+"""Лента подписок: посты раскладываются подписчикам при публикации.
+
+Выше своей самой старой записи лента полна: в ней все разложенные посты
+авторов, на которых подписан пользователь. Остальное дочитывает
+TimelinePaginator при выдаче:
+
+* посты популярных авторов (fanned_out=False) — по индексу каждого автора;
+* всё, что старше самой старой записи, — прямо из постов подписок.
+
+Поэтому ленты можно обрезать до TIMELINE_LENGTH записей, не теряя
+глубины листания.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Count
+
+from . import follow_graph
+from .models import Follow, Post, Profile, TimelineEntry
+from .utils import CURSOR_OLDER, CursorPaginator, batches, seek
+
+
+def _entries(user_id, direction, value=None, pk=None):
+    """Записи ленты за ключом (pub_date, post_id) по индексу ленты."""
+    return seek(
+        TimelineEntry.objects.filter(user_id=user_id),
+        direction, value, pk, pk_field='post_id',
+    ).values_list('pub_date', 'post_id')
+
+
+def _delete_older(user_id, pub_date, post_id):
+    """Удаляет записи ленты старше ключа, возвращает их число."""
+    deleted, _ = seek(
+        TimelineEntry.objects.filter(user_id=user_id),
+        CURSOR_OLDER, pub_date, post_id, pk_field='post_id',
+    ).delete()
+    return deleted
+
+
+def _read_at_request(author_id, posts):
+    """Помечает посты автора читаемыми при выдаче ленты."""
+    posts.filter(fanned_out=True).update(fanned_out=False)
+    Profile.objects.filter(
+        user_id=author_id, has_unfanned_posts=False
+    ).update(has_unfanned_posts=True)
+
+
+def _latest_fanned(author_id):
+    """[(pk, pub_date)] последних TIMELINE_BACKFILL разложенных постов."""
+    return list(
+        Post.objects.filter(author_id=author_id, fanned_out=True)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    У популярных авторов подписчиков больше TIMELINE_FANOUT_LIMIT, их
+    посты помечаются fanned_out=False и читаются при выдаче ленты
+    (fan-out-on-read) — и тогда, когда автор опустится ниже лимита.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(followers) > limit:
+        post.fanned_out = False
+        _read_at_request(post.author_id, Post.objects.filter(pk=post.pk))
+        return
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние разложенные посты автора после подписки.
+
+    Если у автора их больше TIMELINE_BACKFILL, записи старше последнего
+    добавленного удаляются: ниже него лента больше не полна.
+    """
+    posts = _latest_fanned(author_id)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    if len(posts) == settings.TIMELINE_BACKFILL:
+        pk, pub_date = posts[-1]
+        _delete_older(user_id, pub_date, pk)
+    trim(user_id)
+
+
+def backfill_authors(author_ids):
+    """Дозаполняет ленты всех подписчиков авторов, например после импорта.
+
+    Посты каждого автора читаются один раз, записи пишутся пачками, а
+    обрезаются только ленты, ставшие длиннее TIMELINE_LENGTH. Посты
+    авторов с подписчиками больше TIMELINE_FANOUT_LIMIT не раскладываются,
+    а помечаются читаемыми при выдаче.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    touched = set()
+    for author_id in author_ids:
+        followers = list(
+            Follow.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)[:limit + 1]
+        )
+        if len(followers) > limit:
+            _read_at_request(
+                author_id, Post.objects.filter(author_id=author_id))
+            continue
+        posts = _latest_fanned(author_id)
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for user_id in followers for pk, pub_date in posts),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        if len(posts) == settings.TIMELINE_BACKFILL:
+            pk, pub_date = posts[-1]
+            for user_ids in batches(followers, batch_size):
+                seek(
+                    TimelineEntry.objects.filter(user_id__in=user_ids),
+                    CURSOR_OLDER, pub_date, pk, pk_field='post_id',
+                ).delete()
+        touched.update(followers)
+    for user_ids in batches(sorted(touched), batch_size):
+        trim_all(user_ids=user_ids)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def trim(user_id, length=None):
+    """Оставляет в ленте length последних записей.
+
+    Возвращает число удалённых записей.
+    """
+    length = length or settings.TIMELINE_LENGTH
+    boundary = _entries(user_id, CURSOR_OLDER)[length - 1:length]
+    for pub_date, post_id in boundary:
+        return _delete_older(user_id, pub_date, post_id)
+    return 0
+
+
+def trim_all(length=None, user_ids=None):
+    """Обрезает ленты длиннее length, по умолчанию — все.
+
+    Возвращает число удалённых записей.
+    """
+    length = length or settings.TIMELINE_LENGTH
+    timelines = TimelineEntry.objects.all()
+    if user_ids is not None:
+        timelines = timelines.filter(user_id__in=user_ids)
+    users = (
+        timelines.values('user')
+        .annotate(entries=Count('pk'))
+        .filter(entries__gt=length)
+        .values_list('user', flat=True)
+    )
+    return sum(trim(user_id, length) for user_id in users)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорный пагинатор ленты подписок пользователя.
+
+    Страница собирается слиянием по ключу (pub_date, pk) из записей ленты,
+    постов популярных авторов и, ниже самой старой записи, постов подписок.
+    Каждый источник читается по своему индексу не дальше per_page + 1.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(Post.objects.for_feed(), per_page)
+        self.user = user
+
+    def seek(self, direction, value=None, pk=None):
+        limit = self.per_page + 1
+        entries = list(_entries(self.user.pk, direction, value, pk)[:limit])
+        found = self.object_list.in_bulk(
+            [post_id for _, post_id in entries])
+        sources = [
+            [found[post_id] for _, post_id in entries if post_id in found]
+        ]
+
+        followed = follow_graph.followees(self.user)
+        read_time_authors = Profile.objects.filter(
+            user__in=followed, has_unfanned_posts=True
+        ).values_list('user_id', flat=True)
+        for author_id in read_time_authors:
+            posts = self.object_list.filter(
+                author_id=author_id, fanned_out=False)
+            sources.append(
+                list(seek(posts, direction, value, pk)[:limit]))
+
+        history = self._history(
+            followed, direction, value, pk, entries, limit)
+        if history is not None:
+            sources.append(list(history[:limit]))
+
+        merged = heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=direction == CURSOR_OLDER,
+        )
+        page, seen = [], set()
+        for post in merged:
+            if post.pk not in seen:
+                seen.add(post.pk)
+                page.append(post)
+                if len(page) == limit:
+                    break
+        return page
+
+    def _history(self, followed, direction, value, pk, entries, limit):
+        """Посты подписок ниже самой старой записи ленты или None."""
+        if not followed:
+            return None
+        posts = self.object_list.filter(author__in=followed)
+        if direction == CURSOR_OLDER:
+            if len(entries) == limit:
+                return None
+            if entries:
+                value, pk = entries[-1]
+            return seek(posts, direction, value, pk)
+        horizon = _entries(self.user.pk, CURSOR_OLDER).last()
+        if horizon is None:
+            return seek(posts, direction, value, pk)
+        if (value, pk) >= horizon:
+            return None
+        return seek(seek(posts, CURSOR_OLDER, *horizon), direction, value, pk)
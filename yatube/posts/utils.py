@@ -1,9 +1,153 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import itertools
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
 
 NUMBER_OF_POSTS: int = 10  # Количество отображаемых статей
+NUMBER_OF_COMMENTS: int = 20  # Комментариев на одной порции
+
+CURSOR_OLDER = 'o'  # Курсор на более ранние записи
+CURSOR_NEWER = 'n'  # Курсор на более свежие записи
+MAX_PK = 2 ** 63 - 1  # Больше не влезает в целочисленный столбец базы
+
+
+def batches(items, size):
+    """Списки по size элементов из любого итерируемого."""
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def seek(queryset, direction, value=None, pk=None, field='pub_date',
+         pk_field='pk'):
+    """Упорядоченные записи за ключом (value, pk) в сторону direction.
+
+    Условие записано как ``field <= value AND (field < value OR pk < pk)``:
+    так SQLite берёт диапазон по индексу (field, pk), а не сканирует
+    таблицу ради OR. Без value — с самого начала в сторону direction.
+    """
+    if direction == CURSOR_OLDER:
+        queryset = queryset.order_by(f'-{field}', f'-{pk_field}')
+        before, after = 'lte', 'lt'
+    else:
+        queryset = queryset.order_by(field, pk_field)
+        before, after = 'gte', 'gt'
+    if value is None:
+        return queryset
+    return queryset.filter(
+        Q(**{f'{field}__{before}': value}),
+        Q(**{f'{field}__{after}': value}) | Q(**{f'{pk_field}__{after}': pk}),
+    )
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (field, pk) без COUNT(*) и OFFSET.
 
+    Страница строится запросом вида
+    ``WHERE (field, pk) < (value, pk) ORDER BY field DESC, pk DESC LIMIT n``,
+    поэтому глубина листания не влияет на стоимость запроса. Позиция
+    передаётся в непрозрачном токене ``?cursor=``.
+    """
+    cursor_mode = True
 
-def paginator(posts, request):
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
+    def __init__(self, object_list, per_page, field='pub_date'):
+        super().__init__(object_list, per_page)
+        self.field = field
+
+    def encode_cursor(self, direction, obj):
+        value = getattr(obj, self.field)
+        if isinstance(value, datetime):
+            # DjangoJSONEncoder отбрасывает микросекунды, а они нужны ключу.
+            value = value.isoformat()
+        payload = json.dumps([direction, value, obj.pk])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padding = '=' * (-len(cursor) % 4)
+        try:
+            payload = base64.urlsafe_b64decode(cursor + padding)
+            direction, value, pk = json.loads(payload.decode())
+            model_field = self.object_list.model._meta.get_field(self.field)
+            value = model_field.to_python(value)
+            pk = int(pk)
+        except (binascii.Error, ValueError, TypeError, OverflowError,
+                ValidationError):
+            raise InvalidCursor(cursor)
+        if direction not in (CURSOR_OLDER, CURSOR_NEWER) or value is None:
+            raise InvalidCursor(cursor)
+        if not -MAX_PK - 1 <= pk <= MAX_PK:
+            raise InvalidCursor(cursor)
+        return direction, value, pk
+
+    def get_page(self, cursor):
+        """Возвращает страницу по курсору, при ошибке — первую страницу."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+    def seek(self, direction, value=None, pk=None):
+        """Записи страницы от ключа (value, pk) в сторону direction."""
+        queryset = seek(self.object_list, direction, value, pk, self.field)
+        return queryset[:self.per_page + 1]
+
+    def page(self, cursor):
+        if cursor:
+            direction, value, pk = self.decode_cursor(cursor)
+        else:
+            direction, value, pk = CURSOR_OLDER, None, None
+        queryset = self.seek(direction, value, pk)
+
+        # Лишняя запись показывает, есть ли что-то за пределами страницы.
+        objects = list(queryset)
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if direction == CURSOR_NEWER:
+            objects.reverse()
+
+        page = Page(objects, 1, self)
+        page.cursor = cursor or ''
+        page.next_cursor = page.previous_cursor = None
+        if objects:
+            if direction == CURSOR_OLDER:
+                has_older, has_newer = has_more, value is not None
+            else:
+                has_older, has_newer = True, has_more
+            if has_older:
+                page.next_cursor = self.encode_cursor(
+                    CURSOR_OLDER, objects[-1])
+            if has_newer:
+                page.previous_cursor = self.encode_cursor(
+                    CURSOR_NEWER, objects[0])
+        return page
+
+
+def paginator(posts, request, field='pub_date'):
+    """Страница ленты: по курсору, либо по номеру для старых ссылек."""
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        classic = Paginator(posts.order_by(f'-{field}', '-pk'),
+                            NUMBER_OF_POSTS)
+        return classic.get_page(page_number)
+    cursor_paginator = CursorPaginator(posts, NUMBER_OF_POSTS, field=field)
+    return cursor_paginator.get_page(request.GET.get('cursor'))
+
+
+def comments_page(post, cursor=None):
+    """Порция комментариев поста, от новых к старым."""
+    comments = post.comments.select_related('author')
+    comment_paginator = CursorPaginator(
+        comments, NUMBER_OF_COMMENTS, field='created')
+    return comment_paginator.get_page(cursor)
@@ -1,60 +1,121 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.page_cache import cache_page
+
+from . import follow_graph, generations, search, stats, timeline
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .utils import paginator
+from .utils import NUMBER_OF_POSTS, comments_page, paginator
+
+
+def _index_version():
+    return generations.versions(generations.INDEX)
+
+
+def _group_version(slug):
+    group_id = (Group.objects.filter(slug=slug)
+                .values_list('pk', flat=True).first())
+    if group_id is not None:
+        return generations.versions(generations.group(group_id))
 
 
+def _profile_version(username):
+    author_id = (User.objects.filter(username=username)
+                 .values_list('pk', flat=True).first())
+    if author_id is not None:
+        return generations.versions(generations.author(author_id))
+
+
+def _post_version(post_id):
+    # Комментарии и правки поста сдвигают поколение его автора.
+    author_id = (Post.objects.filter(pk=post_id)
+                 .values_list('author_id', flat=True).first())
+    if author_id is not None:
+        return generations.versions(generations.author(author_id))
+
+
+@cache_page(_index_version)
 def index(request):
-    posts = Post.objects.all()
+    posts = Post.objects.for_feed()
     page_obj = paginator(posts, request)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **generations.context(generations.INDEX),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_page(_group_version)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related()
+    posts = group.posts.for_feed()
     page_obj = paginator(posts, request)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **generations.context(generations.group(group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page(_profile_version)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
+    author_posts = author.posts.for_feed()
     page_obj = paginator(author_posts, request)
-    following = (request.user.is_authenticated
-                 and author.following.filter(user=request.user).exists())
     context = {
         'author': author,
+        'stats': stats.get_stats(author),
         'page_obj': page_obj,
         'posts': author_posts,
-        'following': following,
-
+        **generations.context(generations.author(author.pk)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    results = Paginator(search.search(query), NUMBER_OF_POSTS)
+    context = {
+        'query': query,
+        'page_obj': results.get_page(request.GET.get('page')),
+        'paginator_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@cache_page(_post_version)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    post_comment = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    post_comment = comments_page(post)
     form = CommentForm()
     contex = {
         'post': post,
+        'author_stats': stats.get_stats(post.author),
         'post_comment': post_comment,
         'form': form
     }
     return render(request, 'posts/post_detail.html', contex)
 
 
+def post_comments(request, post_id):
+    """HTML-фрагмент со следующей порцией комментариев."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'post_comment': comments_page(post, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST, files=request.FILES or None)
     context = {
@@ -77,7 +138,7 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post,
     )
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id=post_id)
     if form.is_valid():
         form.save()
@@ -92,6 +153,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -105,14 +167,22 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    if request.GET.get('page') is not None:
+        # Старые ссылки с номером страницы читают посты подписок напрямую.
+        posts = Post.objects.for_feed().filter(
+            author__in=follow_graph.followees(request.user))
+        page_obj = paginator(posts, request)
+    else:
+        feed = timeline.TimelinePaginator(request.user, NUMBER_OF_POSTS)
+        page_obj = feed.get_page(request.GET.get('cursor'))
     context = {
-        'page_obj': paginator(posts, request),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -121,6 +191,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
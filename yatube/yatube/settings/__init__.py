@@ -0,0 +1,25 @@
+"""Настройки проекта по профилям.
+
+base — общее для всех профилей, dev — разработка и тесты (DEBUG,
+debug_toolbar), prod — боевой сервер. Профиль выбирает переменная
+окружения YATUBE_ENV, по умолчанию dev. Профиль можно указать и напрямую:
+DJANGO_SETTINGS_MODULE=yatube.settings.prod.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv
+
+load_dotenv()
+
+profile = os.getenv('YATUBE_ENV', 'dev')
+
+if profile == 'dev':
+    from .dev import *  # noqa: F401,F403
+elif profile == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(
+        f'Неизвестный профиль настроек YATUBE_ENV={profile!r}, '
+        f'ожидается dev или prod'
+    )
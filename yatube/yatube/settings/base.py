@@ -0,0 +1,201 @@
+import os
+import tempfile
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+SECRET_KEY = os.getenv(
+    "SECRET_KEY", default='ptc6-zc2%by1q56_4u*d+=m&f0edpdi&y%q@hkm72x9f*+4tf+'
+)
+
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    'localhost',
+    '127.0.0.1',
+    '[::1]',
+    'testserver',
+]
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'posts.apps.PostsConfig',
+    'users.apps.UsersConfig',
+    'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
+    'sorl.thumbnail',
+]
+
+MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.RequestProfilingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATES = [
+    {
+        'BACKEND': 'core.template_backends.DjangoTemplates',
+        'DIRS': [TEMPLATES_DIR],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'core.context_processors.year.year',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+STATIC_URL = '/static/'
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# Сколько секунд браузер кэширует статику без хэша в имени; файлы с
+# хэшем (core.middleware.StaticFilesMiddleware) кэшируются навсегда.
+STATIC_MAX_AGE = 60 * 60
+
+LOGIN_URL = 'users:login'
+LOGIN_REDIRECT_URL = 'posts:index'
+
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Лента подписок: посты авторов, у которых подписчиков больше лимита,
+# не раскладываются по лентам, а читаются при запросе. Ленты обрезаются
+# до TIMELINE_LENGTH записей (manage.py trim_timelines), более старые
+# посты читаются из постов подписок.
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BACKFILL = 500
+TIMELINE_LENGTH = 500
+TIMELINE_BATCH_SIZE = 1000
+
+# Фрагменты лент версионируются поколениями (posts.generations), поэтому
+# их можно хранить долго: изменения поста сразу меняют ключ.
+FEED_CACHE_TIMEOUT = 60 * 60
+# Целые страницы (core.page_cache) версионируются теми же поколениями, но
+# в них есть и неверсионированные данные: имена, описания групп. 0 —
+# кэш страниц выключен.
+PAGE_CACHE_TIMEOUT = 5 * 60
+# Подписки пользователя (posts.follow_graph) сбрасываются при каждой
+# подписке и отписке, TTL лишь ограничивает память под неактивных.
+FOLLOW_GRAPH_TIMEOUT = 24 * 60 * 60
+
+# Миниатюры картинок постов строятся в фоне (posts.thumbnails).
+# При THUMBNAIL_WORKERS = 0 (профиль dev и тесты) они строятся сразу после
+# коммита.
+THUMBNAIL_WORKERS = 2
+# Упавшая задача повторяется с паузой THUMBNAIL_RETRY_DELAY секунд,
+# удваивающейся с каждой попыткой (при THUMBNAIL_WORKERS = 0 — без паузы).
+THUMBNAIL_ATTEMPTS = 3
+THUMBNAIL_RETRY_DELAY = 10
+# Сколько постов без миниатюр pregenerate_thumbnails читает из базы за раз.
+THUMBNAIL_SWEEP_BATCH = 500
+# Варианты картинки поста для srcset: каждая ширина в каждом формате,
+# с пропорциями POST_IMAGE_RATIO. Первый формат браузер пробует первым.
+POST_IMAGE_WIDTHS = (320, 640, 960, 1920)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_QUALITY = 80
+
+# Замеры SQL и шаблонов (core.middleware): доля профилируемых запросов и
+# сколько одинаковых запросов за ответ считать признаком N+1.
+REQUEST_PROFILING_SAMPLE_RATE = 1.0
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = 5
+
+# Профилировщик пишет в core.middleware JSON-строку на каждый замеренный
+# запрос (INFO), а при повторах запросов — WARNING.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Метрики (core.metrics): каждый процесс пишет снимок в свой файл в
+# METRICS_DIR, /metrics складывает снимки всех процессов.
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+)
+METRICS_FLUSH_INTERVAL = 5
+# Тесты пишут метрики во временный каталог (core.testing.TestRunner).
+TEST_RUNNER = 'core.testing.TestRunner'
+# /metrics отдаётся персоналу и по заголовку Authorization: Bearer
+# METRICS_TOKEN (bearer_token в конфигурации Prometheus).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# PRAGMA, которые core.signals выполняет на каждом новом соединении SQLite.
+SQLITE_PRAGMAS = {}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
@@ -0,0 +1,16 @@
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, MIDDLEWARE
+
+SETTINGS_PROFILE = 'dev'
+
+DEBUG = True
+
+# Правки шаблонов видны сразу, без ожидания кэша страниц.
+PAGE_CACHE_TIMEOUT = 0
+
+# Миниатюры строятся сразу после коммита: фоновые потоки пережили бы
+# тест и писали бы в уже удалённый MEDIA_ROOT.
+THUMBNAIL_WORKERS = 0
+
+INSTALLED_APPS = INSTALLED_APPS + ['debug_toolbar']
+MIDDLEWARE = MIDDLEWARE + ['debug_toolbar.middleware.DebugToolbarMiddleware']
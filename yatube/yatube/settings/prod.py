@@ -0,0 +1,83 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import BASE_DIR, DATABASES, MIDDLEWARE, TEMPLATES
+
+SETTINGS_PROFILE = 'prod'
+
+DEBUG = False
+
+SECRET_KEY = os.getenv('SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('В профиле prod нужен SECRET_KEY в окружении')
+
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+# Соединение живёт между запросами: не нужно заново открывать файл базы
+# и выполнять PRAGMA на каждый запрос.
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 600)),
+        'OPTIONS': {'timeout': 20},
+    }
+}
+SQLITE_PRAGMAS = {
+    # Читатели не ждут писателя, а писатель — читателей.
+    'journal_mode': 'WAL',
+    # В режиме WAL fsync нужен только на checkpoint.
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # 64 МБ кэша страниц на соединение
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Шаблоны разбираются один раз на процесс, а не на каждый запрос.
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [(
+            'django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
+        )],
+    },
+}]
+
+# Кэш общий для всех воркеров, иначе поколения лент (posts.generations)
+# и фрагменты расходятся между процессами. Блокировки пересчёта
+# (core.cache) держатся на cache.add, поэтому бэкенд должен выполнять его
+# атомарно: Memcached, а пока его нет — таблица в базе, которую создаёт
+# manage.py createcachetable.
+MEMCACHED_LOCATION = os.getenv('MEMCACHED_LOCATION')
+if MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': MEMCACHED_LOCATION.split(','),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'yatube_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+# collectstatic добавляет хэш в имена и кладёт рядом .gz/.br, а
+# StaticFilesMiddleware отдаёт их с Cache-Control: immutable.
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+MIDDLEWARE = ['core.middleware.StaticFilesMiddleware'] + MIDDLEWARE
+
+REQUEST_PROFILING_SAMPLE_RATE = float(
+    os.getenv('REQUEST_PROFILING_SAMPLE_RATE', 0.01)
+)